@@ -1,20 +1,45 @@
-from flask import Flask, request, jsonify, send_file, make_response, url_for, render_template, session, redirect, Response
+from flask import Flask, Request, request, jsonify, send_file, make_response, url_for, render_template, session, redirect, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import wrap_file
 import os
 import io
 import tempfile
+import multiprocessing
 from dotenv import load_dotenv
 import logging
 import numpy as np
-from pydub import AudioSegment
 import json
 from api_calls import (
     call_google_cloud_vision_api,
     call_llm_api,
-    stream_audio,
-    wav_beat_tracking_from_bytes,
-    beat_adjustment
+    download_youtube_audio,
+    FixtureExtractor,
+    NATIVE_AUDIO_MIMETYPES,
+    FFMPEG_BINARY,
+    ANALYSIS_PROFILES,
+    beat_adjustment,
+    beat_adjustment_batch,
+    beat_cache_key,
+    audio_window_key,
+    change_audio_speed,
+    AUDIO_OUTPUT_FORMATS,
+    parse_bitrate,
+    process_audio_pipeline,
+    generate_beatmap,
+    extract_audio_features,
+    warm_up_audio_worker,
+    BEATMAP_DIFFICULTIES
 )
+from audio_cache import (
+    BeatCache, BeatmapCache, RenderCache, DownloadCache, FeatureCache, hash_audio_bytes, hash_audio_source, beatmap_cache_key
+)
+from audio_workers import AudioWorkerPool, WorkerPoolBusy
+from audio_jobs import JobManager
+from audio_prerender import TempoLadderPrerenderer, parse_tempo_ladder
+from beatmap_codec import (
+    encode_beatmap, beat_times_to_ms, BEATMAP_ENCODINGS, BEATMAP_MIMETYPE, encode_feature_bundle, FEATURES_MIMETYPE
+)
+import gzip
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from google.oauth2 import id_token
@@ -27,11 +52,64 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Uploads above this size are spooled to a named file in UPLOAD_FOLDER
+UPLOAD_SPOOL_THRESHOLD = 500 * 1024
+
+
+class SpooledUploadRequest(Request):
+    """
+    Writes large uploaded files to a named temp file instead of memory.
+
+    Endpoints hand the file's path to the audio workers and hashers, which
+    memory-map it or let ffmpeg read it, so a large upload is never copied
+    into a Python bytes object or pickled into a worker. The file is removed
+    when the request is closed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._spooled_paths = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if (total_content_length or 0) <= UPLOAD_SPOOL_THRESHOLD:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        # Not delete-on-close: on Windows such a file cannot be opened again
+        # by path (ffmpeg, the workers, os.link) while this handle is open
+        spooled = tempfile.NamedTemporaryFile('wb+', dir=app.config['UPLOAD_FOLDER'], prefix='upload-', delete=False)
+        self._spooled_paths.append(spooled.name)
+        return spooled
+
+    def close(self):
+        super().close()
+        for path in self._spooled_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove spooled upload {path}: {str(e)}")
+        self._spooled_paths = []
+
+
+def upload_source(file_storage):
+    """
+    The path of a spooled upload, or its bytes when it was small enough to
+    stay in memory. Audio and document helpers accept either.
+    """
+    stream = file_storage.stream
+    if isinstance(getattr(stream, 'name', None), str) and os.path.isfile(stream.name):
+        stream.flush()
+        return stream.name
+    return file_storage.read()
+
+
 # Initialize Flask app
 app = Flask(__name__, static_folder="static", template_folder="templates")
+app.request_class = SpooledUploadRequest
 CORS(app)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp()
+# Raise MAX_UPLOAD_MB for long audio; uploads are spooled to disk, not held in memory
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("MAX_UPLOAD_MB", 16)) * 1024 * 1024
+app.config['UPLOAD_FOLDER'] = os.environ.get("UPLOAD_SPOOL_DIR") or tempfile.mkdtemp()
 
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("SQLALCHEMY_DATABASE_URI", "sqlite:///database.db")
@@ -47,6 +125,63 @@ app.config.update(
 db = SQLAlchemy(app)
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
+
+# Beat-tracking results keyed by the hash of the uploaded audio
+beat_cache = BeatCache(
+    path=os.environ.get("BEAT_CACHE_PATH"),
+    max_entries=int(os.environ.get("BEAT_CACHE_MAX_ENTRIES", 1000))
+)
+
+# Generated game charts per (audio, tempo, difficulty), next to the analyses
+beatmap_cache = BeatmapCache(
+    path=os.environ.get("BEAT_CACHE_PATH"),
+    max_entries=int(os.environ.get("BEATMAP_CACHE_MAX_ENTRIES", 5000))
+)
+
+# Background jobs for long pipelines (progress via SSE, result fetched later)
+audio_jobs = JobManager(
+    max_workers=int(os.environ.get("AUDIO_JOB_THREADS", 4)),
+    ttl=float(os.environ.get("AUDIO_JOB_TTL", 3600))
+)
+
+# Rendered (stretched + encoded) audio, stored on disk and served as files
+render_cache = RenderCache(
+    directory=os.environ.get("RENDER_CACHE_DIR"),
+    max_bytes=int(os.environ.get("RENDER_CACHE_MAX_MB", 1024)) * 1024 * 1024
+)
+
+# Feature bundles (beats, onset envelope, RMS, waveform peaks) for the game
+feature_cache = FeatureCache(
+    directory=os.environ.get("FEATURE_CACHE_DIR"),
+    max_bytes=int(os.environ.get("FEATURE_CACHE_MAX_MB", 256)) * 1024 * 1024
+)
+
+# YouTube downloads keyed by video ID; hits skip yt-dlp entirely
+download_cache = DownloadCache(
+    directory=os.environ.get("YOUTUBE_CACHE_DIR"),
+    max_bytes=int(os.environ.get("YOUTUBE_CACHE_MAX_MB", 2048)) * 1024 * 1024,
+    max_age=float(os.environ.get("YOUTUBE_CACHE_MAX_AGE_HOURS", 24 * 7)) * 3600
+)
+
+# Offline mode: serve <video_id>.<ext> files from a local directory instead of YouTube
+youtube_extractor = (
+    FixtureExtractor(os.environ["YOUTUBE_FIXTURE_DIR"]) if os.environ.get("YOUTUBE_FIXTURE_DIR") else None
+)
+
+# CPU-bound audio stages run in worker processes so they never block the
+# request threads serving the rest of the app
+audio_pool = AudioWorkerPool(
+    max_workers=int(os.environ.get("AUDIO_WORKERS", 0)) or None,
+    max_queue=int(os.environ["AUDIO_QUEUE_SIZE"]) if os.environ.get("AUDIO_QUEUE_SIZE") else None,
+    timeout=float(os.environ.get("AUDIO_JOB_TIMEOUT", 120)),
+    retry_after=int(os.environ.get("AUDIO_RETRY_AFTER", 5))
+)
+# Workers otherwise spawn (and JIT-compile the beat tracker) on the first
+# audio request. Opt-in here so importing the app spawns nothing; the dev
+# server below always warms up. Never from a worker re-importing this module.
+if (os.environ.get("AUDIO_POOL_WARMUP", "false").lower() in ('1', 'true', 'yes')
+        and multiprocessing.current_process().name == 'MainProcess'):
+    audio_pool.warm_up(warm_up_audio_worker)
 # region login and txt
 # ----------------------------
 # Database Models
@@ -238,6 +373,269 @@ def init_db():
 def handle_error(message, status_code=400):
     return jsonify({'error': message}), status_code
 
+def render_codec(format, bitrate=None):
+    """Render-cache codec label, e.g. "opus-96k"; the format default is used when bitrate is None."""
+    bitrate = parse_bitrate(format, bitrate)
+    return f"{format}-{bitrate}" if bitrate else format
+
+
+def parse_output_format(values):
+    """
+    Reads and validates 'format' and 'bitrate' from form data or a JSON body.
+
+    Returns:
+        tuple: (format, bitrate, error_response) with error_response None when
+            the values are valid.
+    """
+    output_format = str(values.get('format') or 'mp3').lower()
+    try:
+        bitrate = parse_bitrate(output_format, values.get('bitrate'))
+    except ValueError as e:
+        return None, None, handle_error(str(e))
+    return output_format, bitrate, None
+
+
+def parse_audio_window(values):
+    """
+    Reads and validates the optional 'offset' and 'duration' (seconds) of a
+    window from form data, query args or a JSON body.
+
+    Returns:
+        tuple: (offset, duration, error_response); offset and duration are
+            None when not given.
+    """
+    try:
+        offset = float(values['offset']) if values.get('offset') not in (None, '') else None
+        duration = float(values['duration']) if values.get('duration') not in (None, '') else None
+    except (TypeError, ValueError):
+        return None, None, handle_error('offset and duration must be numbers of seconds')
+    if offset is not None and offset < 0:
+        return None, None, handle_error('offset must not be negative')
+    if duration is not None and duration <= 0:
+        return None, None, handle_error('duration must be positive')
+    return offset, duration, None
+
+
+# Optional tempo ladder pre-rendered after a song's first analysis, e.g.
+# PRERENDER_TEMPOS=60-180:10; its renders run in their own niced workers
+PRERENDER_FORMAT = os.environ.get("PRERENDER_FORMAT", "mp3")
+tempo_ladder = TempoLadderPrerenderer(
+    AudioWorkerPool(
+        max_workers=int(os.environ.get("PRERENDER_WORKERS", 1)),
+        max_queue=0,
+        timeout=float(os.environ.get("AUDIO_JOB_TIMEOUT", 120)),
+        niceness=int(os.environ.get("PRERENDER_NICENESS", 19))
+    ),
+    render_cache,
+    parse_tempo_ladder(os.environ.get("PRERENDER_TEMPOS")),
+    format=PRERENDER_FORMAT,
+    bitrate=os.environ.get("PRERENDER_BITRATE"),
+    codec=render_codec(PRERENDER_FORMAT, os.environ.get("PRERENDER_BITRATE")),
+    ext=AUDIO_OUTPUT_FORMATS[PRERENDER_FORMAT]['ext']
+)
+
+
+def cached_analysis(source_key, profile, progressive=False):
+    """
+    Looks up a beat analysis. A progressive lookup also accepts a grid that
+    was extrapolated; a fully tracked one is preferred either way.
+    """
+    cached = beat_cache.get(beat_cache_key(source_key, profile))
+    if cached is None and progressive:
+        cached = beat_cache.get(beat_cache_key(source_key, profile, extrapolated=True))
+    return cached
+
+
+def run_beat_pipeline(audio_bytes, target_tempo=None, profile='full', chunked=False, wait=False,
+                      format='mp3', bitrate=None, offset=None, duration=None, progressive=False):
+    """
+    Beat analysis for an upload (bytes, or the path of a spooled upload):
+    checks the beat and render caches first and runs only what is still
+    missing (decode, tracking, stretching) in the worker pool. With wait
+    set, a full pool is waited on instead of raising WorkerPoolBusy (for
+    background jobs). format and bitrate select the encoding of the
+    rendered audio; offset and duration restrict everything to a window of
+    the song, cached separately from the whole song. progressive selects
+    progressive_beat_tracking; extrapolated grids are cached apart from
+    fully tracked ones.
+
+    Returns:
+        tuple: (audio_hash, result) where result holds 'tempo', 'beat_times'
+            and 'duration', plus the process_audio_pipeline outputs for a
+            target_tempo. 'audio' is the path of the cached render when it
+            could be stored, otherwise the encoded bytes. Progressive runs
+            add 'beat_tracking' (method 'cached' on a beat-cache hit).
+    """
+    codec = render_codec(format, bitrate)
+    audio_hash = hash_audio_source(audio_bytes)
+    source_key = audio_window_key(audio_hash, offset, duration)
+    cached = cached_analysis(source_key, profile, progressive)
+    if cached is not None and progressive:
+        cached['beat_tracking'] = {'method': 'cached'}
+    if cached is not None and not target_tempo:
+        return audio_hash, cached
+
+    if cached is not None:
+        # Adjusting a cached grid is cheap; only the render may be missing
+        adjusted_beats, speed_factor = beat_adjustment(cached['tempo'], cached['beat_times'], target_tempo)
+        rendered_path = render_cache.get(source_key, speed_factor, codec)
+        if rendered_path is not None:
+            return audio_hash, dict(
+                cached, adjusted_beats=adjusted_beats, speed_factor=speed_factor, audio=rendered_path
+            )
+
+    analysis = (cached['tempo'], cached['beat_times']) if cached is not None else None
+    result = audio_pool.run(
+        process_audio_pipeline, audio_bytes,
+        target_tempo=target_tempo, profile=profile, analysis=analysis, chunked=chunked, wait=wait,
+        format=format, bitrate=bitrate, offset=offset, duration=duration, progressive=progressive
+    )
+    if cached is not None and progressive:
+        result['beat_tracking'] = cached['beat_tracking']
+    if cached is None:
+        tracking = result.get('beat_tracking')
+        extrapolated = tracking is not None and tracking['method'] == 'extrapolated'
+        if tracking is not None:
+            logger.info(f"Beat tracking for {audio_hash[:12]}: {tracking['method']} ({tracking['reason']})")
+        beat_cache.put(
+            beat_cache_key(source_key, profile, extrapolated=extrapolated),
+            result['tempo'], result['beat_times'], result['duration']
+        )
+        if source_key == audio_hash:
+            tempo_ladder.schedule(audio_hash, audio_bytes, result['tempo'], result['beat_times'])
+    if target_tempo:
+        rendered_path = render_cache.put(
+            source_key, result['speed_factor'], codec, result['audio'], ext=AUDIO_OUTPUT_FORMATS[format]['ext']
+        )
+        if rendered_path is not None:
+            result['audio'] = rendered_path
+    return audio_hash, result
+
+
+def beat_times_json(beat_times):
+    """
+    Beat times in seconds for a JSON response, rounded to the millisecond
+    like the binary beatmap. Short decimals such as 0.511 serialise in a
+    third of the characters of the raw float32 values.
+    """
+    return (beat_times_to_ms(beat_times) / 1000.0).tolist()
+
+
+def parse_tempo_list(value):
+    """Parses target tempos given as a JSON list or a comma-separated string."""
+    if isinstance(value, str):
+        value = value.strip()
+        value = json.loads(value) if value.startswith('[') else [v for v in value.split(',') if v.strip()]
+    return [float(v) for v in (value or [])]
+
+
+def pool_busy_response(error):
+    """503 with Retry-After when the audio worker queue is full."""
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+AUDIO_CHUNK_SIZE = 64 * 1024
+
+def iter_audio_chunks(audio_bytes, start, stop, chunk_size=AUDIO_CHUNK_SIZE):
+    """Yields audio_bytes[start:stop] in chunks without copying the whole range."""
+    view = memoryview(audio_bytes)
+    for offset in range(start, stop, chunk_size):
+        yield bytes(view[offset:min(offset + chunk_size, stop)])
+
+
+def iter_file_chunks(audio_file, start, stop, chunk_size=AUDIO_CHUNK_SIZE):
+    """Yields bytes start..stop of an open file in chunks, then closes it."""
+    try:
+        audio_file.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = audio_file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        audio_file.close()
+
+
+def audio_file_response(audio, mimetype, filename, etag=None):
+    """
+    Streams generated audio to the client in chunks, honouring Range.
+
+    A single-range Range header gets a 206 with just that slice (416 if it
+    lies past the end), so <audio> elements can start playback and seek
+    before the whole file has arrived. Werkzeug's conditional handling only
+    covers GET/HEAD, and most of our audio comes back from POST endpoints,
+    so the range is applied here. A stale If-Range falls back to the full
+    body.
+
+    Args:
+        audio (bytes | str): Encoded audio, or the path of a cached render.
+            Whole files go out through the WSGI file wrapper, the same path
+            send_file uses, so the server can hand them to sendfile.
+        mimetype (str): Content type of the audio.
+        filename (str): Download name for Content-Disposition.
+        etag (str): Entity tag; defaults to the content hash for bytes and
+            the file name for cached renders (which are content-addressed).
+
+    Raises:
+        FileNotFoundError: If a cached file was evicted before it could be
+            opened; see cached_audio_response. Once open, eviction cannot
+            cut the stream short.
+    """
+    is_path = isinstance(audio, str)
+    audio_file = open(audio, 'rb') if is_path else None
+    length = os.fstat(audio_file.fileno()).st_size if is_path else len(audio)
+    if etag is None:
+        etag = os.path.splitext(os.path.basename(audio))[0] if is_path else hash_audio_bytes(audio)
+    start, stop, status = 0, length, 200
+
+    byte_range = request.range
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range.strip().strip('"') != etag:
+        byte_range = None
+    if byte_range is not None and len(byte_range.ranges) == 1:
+        bounds = byte_range.range_for_length(length)
+        if bounds is None:
+            if audio_file is not None:
+                audio_file.close()
+            response = jsonify({'error': 'Requested range not satisfiable'})
+            response.status_code = 416
+            response.headers['Content-Range'] = f'bytes */{length}'
+            return response
+        (start, stop), status = bounds, 206
+
+    if not is_path:
+        body = iter_audio_chunks(audio, start, stop)
+    elif status == 200:
+        body = wrap_file(request.environ, audio_file, AUDIO_CHUNK_SIZE)
+    else:
+        body = iter_file_chunks(audio_file, start, stop)
+
+    response = Response(body, status=status, mimetype=mimetype, direct_passthrough=True)
+    response.headers['Content-Length'] = str(stop - start)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+    response.set_etag(etag)
+    return response
+
+def cached_audio_response(audio, mimetype, filename, rerender):
+    """
+    audio_file_response for audio that may be a path in a DiskCache (a
+    render or a download). The cache can evict the file between the lookup
+    and the open; that is a miss like any other, so rerender() is called
+    once for fresh audio.
+    """
+    try:
+        return audio_file_response(audio, mimetype, filename)
+    except FileNotFoundError:
+        logger.info(f"Cached audio evicted before it was served: {audio}")
+        return audio_file_response(rerender(), mimetype, filename)
+
 @app.route('/api/extract-text', methods=['POST'])
 def extract_text():
     """
@@ -263,7 +661,7 @@ def extract_text():
         return handle_error('No selected file')
     
     try:
-        file_bytes = file.read()
+        file_bytes = upload_source(file)
         content_type = file.content_type
         
         # Process the file
@@ -344,9 +742,9 @@ def get_audio():
         description: YouTube URL to stream audio from
     responses:
       200:
-        description: Audio file
+        description: Audio file in YouTube's native container (audio/mp4 or audio/webm)
         content:
-          audio/mpeg:
+          audio/mp4:
             schema:
               type: string
               format: binary
@@ -358,13 +756,20 @@ def get_audio():
         return handle_error('No URL provided')
     
     try:
-        mp3_bytes = stream_audio(url)
-        if not mp3_bytes:
-            return handle_error('Failed to process audio', 500)
+        download = download_youtube_audio(url, cache=download_cache, extractor=youtube_extractor)
+        ext = download['ext']
         
-        response = make_response(mp3_bytes)
-        response.headers['Content-Type'] = 'audio/mpeg'
-        response.headers['Content-Disposition'] = 'attachment; filename=audio.mp3'
+        # Cached downloads are served straight from disk
+        response = cached_audio_response(
+            download.get('path') or download['audio'],
+            NATIVE_AUDIO_MIMETYPES.get(ext, 'application/octet-stream'),
+            f'audio.{ext}',
+            lambda: youtube_audio_source(url)
+        )
+        if download['video_id']:
+            response.headers['X-Video-Id'] = download['video_id']
+        if download['duration']:
+            response.headers['X-Audio-Duration'] = str(download['duration'])
         return response
     except Exception as e:
         logger.error(f"Error streaming audio: {str(e)}")
@@ -387,6 +792,45 @@ def analyze_audio():
         format: float
         required: false
         description: Optional target tempo in BPM. If provided, returns adjusted audio.
+      - name: profile
+        in: formData
+        type: string
+        required: false
+        default: full
+        description: Analysis profile - fast (11025 Hz mono), balanced (22050 Hz) or full (native rate)
+      - name: chunked
+        in: formData
+        type: boolean
+        required: false
+        default: false
+        description: Analyse block by block with bounded memory (for very long recordings)
+      - name: format
+        in: formData
+        type: string
+        required: false
+        default: mp3
+        description: Output codec of the adjusted audio - mp3, opus (Ogg), aac (m4a) or wav
+      - name: bitrate
+        in: formData
+        type: string
+        required: false
+        description: Output bitrate, e.g. 96k (defaults - mp3 192k, opus 96k, aac 128k)
+      - name: offset
+        in: formData
+        type: number
+        required: false
+        description: Start of the window to process, in seconds (default - start of the song)
+      - name: duration
+        in: formData
+        type: number
+        required: false
+        description: Length of the window in seconds (default - to the end); beat times are relative to the window
+      - name: progressive
+        in: formData
+        type: boolean
+        required: false
+        default: false
+        description: Estimate tempo on the first 30 s and extrapolate the beat grid when it is steady, falling back to full tracking otherwise; the response reports the path taken as beat_tracking
     responses:
       200:
         description: Audio analysis results and optionally adjusted audio
@@ -394,65 +838,677 @@ def analyze_audio():
         description: Invalid input
     """
     try:
-        os.environ['PATH'] = r'C:\Users\Syuen\GROUP\rhythm-notes\CS Girlies\ffmpeg\ffmpeg-8.0-essentials_build\bin;' + os.environ['PATH']
         if 'file' not in request.files:
             return handle_error('No file provided')
             
         audio_file = request.files['file']
         target_tempo = request.form.get('target_tempo', type=float)
+        profile = request.form.get('profile', 'full')
+        if profile not in ANALYSIS_PROFILES:
+            return handle_error(f"profile must be one of: {', '.join(ANALYSIS_PROFILES)}")
+        chunked = request.form.get('chunked', 'false').lower() in ('1', 'true', 'yes')
+        progressive = request.form.get('progressive', 'false').lower() in ('1', 'true', 'yes')
+        output_format, bitrate, error = parse_output_format(request.form)
+        if error:
+            return error
+        offset, duration, error = parse_audio_window(request.form)
+        if error:
+            return error
+        window = {'offset': offset, 'duration': duration} if offset or duration else {}
         
-        # Read the audio file
-        audio_bytes = audio_file.read()
-        
-        # Perform beat tracking
-        original_tempo, beat_times = wav_beat_tracking_from_bytes(audio_bytes)
+        # Spooled uploads are passed by path; cached analyses skip decoding and tracking
+        audio_bytes = upload_source(audio_file)
+        audio_hash, pipeline = run_beat_pipeline(
+            audio_bytes, target_tempo=target_tempo, profile=profile, chunked=chunked,
+            format=output_format, bitrate=bitrate, offset=offset, duration=duration, progressive=progressive
+        )
+        original_tempo, beat_times = pipeline['tempo'], pipeline['beat_times']
+        beatmap_args = dict(window, progressive=1) if progressive else window
         
         # Calculate beat intervals
-        beat_intervals = np.diff(beat_times).tolist() if len(beat_times) > 1 else []
+        beat_ms = beat_times_to_ms(beat_times)
+        beat_intervals = (np.diff(beat_ms) / 1000.0).tolist() if len(beat_ms) > 1 else []
+        end_time = beat_ms[-1] / 1000.0 if len(beat_ms) > 0 else 0
         
         result = {
             'status': 'success',
+            'audio_hash': audio_hash,
+            'beatmap_url': url_for('get_beatmap', audio_hash=audio_hash, profile=profile, **beatmap_args),
             'original_tempo': float(original_tempo),
             'beat_count': len(beat_times),
-            'beat_times': beat_times.tolist(),
+            'beat_times': (beat_ms / 1000.0).tolist(),
             'beat_intervals': beat_intervals,
-            'duration': float(beat_times[-1]) if len(beat_times) > 0 else 0
+            'duration': end_time
         }
+        if window:
+            result['window'] = window
+        if progressive:
+            result['beat_tracking'] = pipeline['beat_tracking']
         
         # If target tempo is provided, adjust the audio and include it in the response
         if target_tempo:
-            # Adjust beats to target tempo
-            adjusted_beats, speed_factor = beat_adjustment(original_tempo, beat_times, target_tempo)
-            
-            # Adjust the audio
-            adjusted_audio = change_audio_speed_pydub(audio_bytes, speed_factor)
+            adjusted_beats = pipeline['adjusted_beats']
+            adjusted_audio = pipeline['audio']
             
             result = {
                 'status': 'success',
+                'audio_hash': audio_hash,
+                'beatmap_url': url_for(
+                    'get_beatmap', audio_hash=audio_hash, profile=profile, tempo=target_tempo, **beatmap_args
+                ),
                 'original_tempo': float(original_tempo),
                 'beat_count': len(beat_times),
-                'beat_times': adjusted_beats.tolist(),
+                'beat_times': beat_times_json(adjusted_beats),
                 'beat_intervals': beat_intervals,
-                'duration': float(beat_times[-1]) if len(beat_times) > 0 else 0
+                'duration': end_time
             }
-            # Create a response with the adjusted audio
-            response = make_response(adjusted_audio)
-            response.headers['Content-Type'] = 'audio/mp3'
-            response.headers['Content-Disposition'] = f'attachment; filename=adjusted_{target_tempo:.0f}bpm.mp3'
+            # Stream the adjusted audio (with Range support)
+            response = cached_audio_response(
+                adjusted_audio, AUDIO_OUTPUT_FORMATS[output_format]['mimetype'],
+                f"adjusted_{target_tempo:.0f}bpm.{AUDIO_OUTPUT_FORMATS[output_format]['ext']}",
+                lambda: run_beat_pipeline(
+                    audio_bytes, target_tempo=target_tempo, profile=profile, chunked=chunked,
+                    format=output_format, bitrate=bitrate, offset=offset, duration=duration, progressive=progressive
+                )[1]['audio']
+            )
             
             # Add analysis to the response headers
             for key, value in result.items():
                 if isinstance(value, (str, int, float)):
                     response.headers[f'X-Audio-{key.replace("_", "-")}'] = str(value)
+            if progressive:
+                response.headers['X-Beat-Tracking'] = pipeline['beat_tracking']['method']
             
             return response
         
         return jsonify(result)
         
+    except WorkerPoolBusy as e:
+        return pool_busy_response(e)
+    except TimeoutError:
+        return handle_error('Audio analysis timed out', 504)
     except Exception as e:
         logger.error(f"Error analyzing audio: {str(e)}")
         return handle_error(f'Error analyzing audio: {str(e)}', 500)
 
+# Length of the first chunk of /api/audio/analyze-stream
+STREAM_FIRST_SECONDS = float(os.environ.get("STREAM_FIRST_SECONDS", 15))
+
+
+def remove_stream_source(audio_bytes):
+    """Removes the hard link analyze-stream makes to a spooled upload."""
+    if isinstance(audio_bytes, str) and audio_bytes.endswith('.stream') and os.path.exists(audio_bytes):
+        os.remove(audio_bytes)
+
+
+def ndjson_line(event, **fields):
+    """One newline-delimited JSON event of a streamed response."""
+    return json.dumps(dict(fields, event=event)) + '\n'
+
+
+@app.route('/api/audio/analyze-stream', methods=['POST'])
+def analyze_audio_stream():
+    """
+    Analyze audio and stream the beats as they are found, so playback can start early
+    ---
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: true
+        description: Audio file to analyze
+      - name: profile
+        in: formData
+        type: string
+        required: false
+        default: full
+        description: Analysis profile - fast (11025 Hz mono), balanced (22050 Hz) or full (native rate)
+      - name: first_seconds
+        in: formData
+        type: number
+        required: false
+        default: 15
+        description: Length of the opening window whose beats are sent first
+    responses:
+      200:
+        description: >
+          application/x-ndjson, one JSON object per line. "beats" events carry
+          beat_times (integer ms) in order, the opening window first and then
+          the rest of the track; a final "done" event carries tempo, duration,
+          beat_count (the number of beats streamed), audio_hash and
+          beatmap_url, or an "error" event the error.
+      400:
+        description: Invalid input
+      503:
+        description: Audio workers are busy
+    """
+    if 'file' not in request.files:
+        return handle_error('No file provided')
+    profile = request.form.get('profile', 'full')
+    if profile not in ANALYSIS_PROFILES:
+        return handle_error(f"profile must be one of: {', '.join(ANALYSIS_PROFILES)}")
+    first_seconds = request.form.get('first_seconds', STREAM_FIRST_SECONDS, type=float)
+    if first_seconds is None or first_seconds <= 0:
+        return handle_error('first_seconds must be a positive number')
+
+    audio_bytes = upload_source(request.files['file'])
+    audio_hash = hash_audio_source(audio_bytes)
+    cached = cached_analysis(audio_hash, profile)
+    if cached is None and isinstance(audio_bytes, str):
+        # The request removes its spooled upload once the view returns, before
+        # the stream is sent; a hard link keeps the file for the workers
+        stream_path = f"{audio_bytes}.stream"
+        os.link(audio_bytes, stream_path)
+        audio_bytes = stream_path
+
+    # The opening window and the whole track run side by side on two
+    # workers; the window is queued first so it never waits for the track
+    first = full = None
+    if cached is None:
+        try:
+            first = audio_pool.submit(process_audio_pipeline, audio_bytes, profile=profile, duration=first_seconds)
+            full = audio_pool.submit(process_audio_pipeline, audio_bytes, profile=profile)
+        except WorkerPoolBusy as e:
+            if first is not None:
+                first.cancel()
+            remove_stream_source(audio_bytes)
+            return pool_busy_response(e)
+
+    def generate():
+        resume_at = 0.0
+        streamed = 0
+        try:
+            if cached is not None:
+                analysis = cached
+            else:
+                # Beats of the opening window, minus any the full pass may
+                # place differently at the window's edge
+                early = audio_pool.result(first)['beat_times']
+                period = float(np.median(np.diff(early))) if len(early) > 1 else 0.0
+                early = early[early <= first_seconds - period / 2]
+                if len(early):
+                    yield ndjson_line('beats', beat_times=beat_times_to_ms(early).tolist())
+                    streamed += len(early)
+                    # The rest continues from half a beat after the last one sent
+                    resume_at = float(early[-1]) + max(period / 2, 1e-3)
+
+                analysis = audio_pool.result(full)
+                beat_cache.put(
+                    beat_cache_key(audio_hash, profile), analysis['tempo'], analysis['beat_times'], analysis['duration']
+                )
+                tempo_ladder.schedule(audio_hash, audio_bytes, analysis['tempo'], analysis['beat_times'])
+
+            beat_times = analysis['beat_times']
+            rest = beat_times[beat_times >= resume_at]
+            if len(rest):
+                yield ndjson_line('beats', beat_times=beat_times_to_ms(rest).tolist())
+                streamed += len(rest)
+            yield ndjson_line(
+                'done',
+                audio_hash=audio_hash,
+                beatmap_url=url_for('get_beatmap', audio_hash=audio_hash, profile=profile),
+                tempo=float(analysis['tempo']),
+                duration=float(analysis['duration']) if analysis.get('duration') else None,
+                beat_count=streamed,
+                cached=cached is not None
+            )
+        except Exception as e:
+            logger.error(f"Error streaming analysis: {str(e)}")
+            for future in (first, full):
+                if future is not None:
+                    future.cancel()
+            yield ndjson_line('error', error=f'Error analyzing audio: {str(e)}')
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(lambda: remove_stream_source(audio_bytes))
+    return response
+
+@app.route('/api/audio/analyze-tempos', methods=['POST'])
+def analyze_audio_tempos():
+    """
+    Analyze a song once and return beat grids for several target tempos
+    ---
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: false
+        description: Audio file to analyze (or send audio_hash instead)
+      - name: audio_hash
+        in: formData
+        type: string
+        required: false
+        description: Hash returned by an earlier analysis; skips the upload
+      - name: target_tempos
+        in: formData
+        type: string
+        required: true
+        description: Target tempos in BPM, comma-separated or a JSON list
+      - name: profile
+        in: formData
+        type: string
+        required: false
+        default: full
+        description: Analysis profile - fast, balanced or full
+      - name: offset
+        in: formData
+        type: number
+        required: false
+        description: Start of the window to process, in seconds (default - start of the song)
+      - name: duration
+        in: formData
+        type: number
+        required: false
+        description: Length of the window in seconds (default - to the end); beat times are relative to the window
+    responses:
+      200:
+        description: Original analysis plus adjusted beat times and speed factor per target
+      400:
+        description: Invalid input
+      404:
+        description: audio_hash is not in the analysis cache
+    """
+    try:
+        params = request.get_json(silent=True) or request.form
+        profile = params.get('profile', 'full')
+        if profile not in ANALYSIS_PROFILES:
+            return handle_error(f"profile must be one of: {', '.join(ANALYSIS_PROFILES)}")
+        
+        try:
+            target_tempos = parse_tempo_list(params.get('target_tempos'))
+        except (TypeError, ValueError):
+            return handle_error('target_tempos must be a list of numbers')
+        if not target_tempos:
+            return handle_error('target_tempos is required')
+        if len(target_tempos) > 64:
+            return handle_error('At most 64 target tempos per request')
+        if not all(40 <= tempo <= 240 for tempo in target_tempos):
+            return handle_error('Target tempos must be between 40 and 240 BPM')
+        
+        offset, duration, error = parse_audio_window(params)
+        if error:
+            return error
+        
+        if 'file' in request.files:
+            audio_hash, analysis = run_beat_pipeline(
+                upload_source(request.files['file']), profile=profile, offset=offset, duration=duration
+            )
+        elif params.get('audio_hash'):
+            audio_hash = params.get('audio_hash')
+            analysis = beat_cache.get(beat_cache_key(audio_window_key(audio_hash, offset, duration), profile))
+            if analysis is None:
+                return handle_error('Unknown audio_hash, upload the file instead', 404)
+        else:
+            return handle_error('No file or audio_hash provided')
+        
+        original_tempo, beat_times = analysis['tempo'], analysis['beat_times']
+        adjusted_grids, speed_factors = beat_adjustment_batch(original_tempo, beat_times, target_tempos)
+        
+        return jsonify({
+            'status': 'success',
+            'audio_hash': audio_hash,
+            'original_tempo': float(original_tempo),
+            'beat_count': len(beat_times),
+            'beat_times': beat_times_json(beat_times),
+            'duration': round(float(beat_times[-1]), 3) if len(beat_times) > 0 else 0,
+            'targets': [
+                {
+                    'target_tempo': target_tempo,
+                    'speed_factor': float(speed_factor),
+                    'beat_count': len(adjusted_beats),
+                    'beat_times': beat_times_json(adjusted_beats),
+                }
+                for target_tempo, adjusted_beats, speed_factor in zip(target_tempos, adjusted_grids, speed_factors)
+            ]
+        })
+        
+    except WorkerPoolBusy as e:
+        return pool_busy_response(e)
+    except TimeoutError:
+        return handle_error('Audio analysis timed out', 504)
+    except Exception as e:
+        logger.error(f"Error analyzing audio tempos: {str(e)}")
+        return handle_error(f'Error analyzing audio: {str(e)}', 500)
+
+# Seconds a client may reuse a beatmap before revalidating it by ETag
+BEATMAP_MAX_AGE = int(os.environ.get("BEATMAP_MAX_AGE", 300))
+
+
+@app.route('/api/audio/beatmap/<audio_hash>', methods=['GET'])
+def get_beatmap(audio_hash):
+    """
+    Binary beatmap for analysed audio, optionally adjusted to a target tempo
+    ---
+    parameters:
+      - name: audio_hash
+        in: path
+        type: string
+        required: true
+        description: Audio hash, as returned in X-Audio-Hash or by the analyze endpoints
+      - name: tempo
+        in: query
+        type: number
+        required: false
+        description: Target tempo in BPM; beat times are those of the adjusted audio
+      - name: profile
+        in: query
+        type: string
+        required: false
+        default: full
+        description: Analysis profile the audio was analysed with
+      - name: encoding
+        in: query
+        type: string
+        required: false
+        default: varint
+        description: Delta encoding - varint or int32
+      - name: offset
+        in: query
+        type: number
+        required: false
+        description: Start of the analysed window, as given to the analyze endpoint
+      - name: duration
+        in: query
+        type: number
+        required: false
+        description: Length of the analysed window, as given to the analyze endpoint
+      - name: progressive
+        in: query
+        type: boolean
+        required: false
+        default: false
+        description: Also accept a grid extrapolated by a progressive analysis
+    responses:
+      200:
+        description: Beat times as delta-encoded integer milliseconds (see beatmap_codec.py)
+      404:
+        description: The audio has not been analysed
+    """
+    profile = request.args.get('profile', 'full')
+    encoding = request.args.get('encoding', 'varint')
+    if encoding not in BEATMAP_ENCODINGS:
+        return handle_error(f"encoding must be one of: {', '.join(BEATMAP_ENCODINGS)}")
+    if profile not in ANALYSIS_PROFILES:
+        return handle_error(f"profile must be one of: {', '.join(ANALYSIS_PROFILES)}")
+    try:
+        target_tempo = float(request.args['tempo']) if 'tempo' in request.args else None
+    except ValueError:
+        return handle_error('tempo must be a number')
+    if target_tempo is not None and not 40 <= target_tempo <= 240:
+        return handle_error('Target tempo must be between 40 and 240 BPM')
+    offset, duration, error = parse_audio_window(request.args)
+    if error:
+        return error
+
+    progressive = request.args.get('progressive', 'false').lower() in ('1', 'true', 'yes')
+
+    source_key = audio_window_key(audio_hash, offset, duration)
+    analysis = cached_analysis(source_key, profile, progressive)
+    if analysis is None:
+        return handle_error('No analysis for this audio; analyse it first', 404)
+
+    beat_times = analysis['beat_times']
+    if target_tempo:
+        beat_times, _ = beat_adjustment(analysis['tempo'], beat_times, target_tempo)
+
+    response = make_response(encode_beatmap(beat_times, encoding))
+    response.mimetype = BEATMAP_MIMETYPE
+    response.headers['X-Original-Tempo'] = str(analysis['tempo'])
+    response.headers['X-Beat-Count'] = str(len(beat_times))
+    if progressive:
+        # May be an extrapolated grid that a full analysis replaces later
+        response.headers['Cache-Control'] = 'public, no-cache'
+    else:
+        # Not immutable: the in-memory, chunked and feature trackers all write
+        # this analysis key and place beats a few ms apart, and an evicted
+        # analysis may be recomputed by a different one. Clients revalidate
+        # against the content ETag once max-age runs out.
+        response.headers['Cache-Control'] = f'public, max-age={BEATMAP_MAX_AGE}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Compress before tagging so the gzip and identity bodies get their own
+    # strong ETags; mtime=0 keeps the gzip bytes (and tag) reproducible
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(gzip.compress(response.get_data(), mtime=0))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.add_etag()
+    response.make_conditional(request)
+    return response
+
+@app.route('/api/beatmap', methods=['GET', 'POST'])
+def generate_game_beatmap():
+    """
+    Playable rhythm-game chart built from the detected beats
+    ---
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: false
+        description: Audio file to analyze (POST; or send audio_hash instead)
+      - name: audio_hash
+        in: query
+        type: string
+        required: false
+        description: Hash returned by an earlier analysis; skips the upload
+      - name: target_tempo
+        in: query
+        type: number
+        required: false
+        description: Chart the beats of the audio adjusted to this BPM (40-240)
+      - name: difficulty
+        in: query
+        type: string
+        required: false
+        default: normal
+        description: easy (every other beat), normal (every beat) or hard (beats and off-beats)
+      - name: profile
+        in: query
+        type: string
+        required: false
+        default: full
+        description: Analysis profile - fast, balanced or full
+      - name: offset
+        in: query
+        type: number
+        required: false
+        description: Start of the analysis window in seconds
+      - name: duration
+        in: query
+        type: number
+        required: false
+        description: Length of the analysis window in seconds
+    responses:
+      200:
+        description: Notes with hit time (ms), lane index, lane name and key hint
+      400:
+        description: Invalid input
+      404:
+        description: audio_hash is not in the analysis cache
+    """
+    try:
+        params = request.get_json(silent=True) or (request.form if request.method == 'POST' else request.args)
+        difficulty = params.get('difficulty', 'normal')
+        if difficulty not in BEATMAP_DIFFICULTIES:
+            return handle_error(f"difficulty must be one of: {', '.join(BEATMAP_DIFFICULTIES)}")
+        profile = params.get('profile', 'full')
+        if profile not in ANALYSIS_PROFILES:
+            return handle_error(f"profile must be one of: {', '.join(ANALYSIS_PROFILES)}")
+        try:
+            target_tempo = float(params['target_tempo']) if params.get('target_tempo') else None
+        except (TypeError, ValueError):
+            return handle_error('target_tempo must be a number')
+        if target_tempo is not None and not 40 <= target_tempo <= 240:
+            return handle_error('Target tempo must be between 40 and 240 BPM')
+        offset, duration, error = parse_audio_window(params)
+        if error:
+            return error
+        
+        if 'file' in request.files:
+            audio_source = upload_source(request.files['file'])
+            audio_hash = hash_audio_source(audio_source)
+        elif params.get('audio_hash'):
+            audio_source = None
+            audio_hash = params.get('audio_hash')
+        else:
+            return handle_error('No file or audio_hash provided')
+        
+        # A cached chart skips analysis, adjustment and serialisation
+        source_key = audio_window_key(audio_hash, offset, duration)
+        cache_key = beatmap_cache_key(source_key, profile, target_tempo, difficulty)
+        payload = beatmap_cache.get(cache_key)
+        if payload is None:
+            if audio_source is not None:
+                _, analysis = run_beat_pipeline(audio_source, profile=profile, offset=offset, duration=duration)
+            else:
+                analysis = beat_cache.get(beat_cache_key(source_key, profile))
+                if analysis is None:
+                    return handle_error('Unknown audio_hash, upload the file instead', 404)
+            
+            beat_times, speed_factor = analysis['beat_times'], 1.0
+            if target_tempo:
+                beat_times, speed_factor = beat_adjustment(analysis['tempo'], beat_times, target_tempo)
+            notes = generate_beatmap(beat_times, difficulty)
+            payload = json.dumps({
+                'status': 'success',
+                'audio_hash': audio_hash,
+                'difficulty': difficulty,
+                'original_tempo': float(analysis['tempo']),
+                'target_tempo': target_tempo,
+                'speed_factor': float(speed_factor),
+                'note_count': len(notes),
+                'notes': notes,
+            }, separators=(',', ':'))
+            beatmap_cache.put(cache_key, payload)
+        
+        return Response(payload, mimetype='application/json')
+        
+    except WorkerPoolBusy as e:
+        return pool_busy_response(e)
+    except TimeoutError:
+        return handle_error('Audio analysis timed out', 504)
+    except Exception as e:
+        logger.error(f"Error generating beatmap: {str(e)}")
+        return handle_error(f'Error generating beatmap: {str(e)}', 500)
+
+@app.route('/api/audio/features', methods=['GET', 'POST'])
+def audio_features():
+    """
+    Beats, onset envelope, loudness and waveform peaks from a single analysis pass
+    ---
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: false
+        description: Audio file to analyze (POST; or send audio_hash instead)
+      - name: audio_hash
+        in: query
+        type: string
+        required: false
+        description: Hash of audio whose features were extracted before
+      - name: profile
+        in: query
+        type: string
+        required: false
+        default: full
+        description: Analysis profile - fast, balanced or full
+      - name: peaks_per_second
+        in: query
+        type: integer
+        required: false
+        default: 50
+        description: Resolution of the waveform peak array (1-1000)
+      - name: offset
+        in: query
+        type: number
+        required: false
+        description: Start of the analysis window in seconds
+      - name: duration
+        in: query
+        type: number
+        required: false
+        description: Length of the analysis window in seconds
+    responses:
+      200:
+        description: Binary float32 feature bundle (see beatmap_codec.py)
+      404:
+        description: No features cached for audio_hash
+    """
+    try:
+        params = request.get_json(silent=True) or (request.form if request.method == 'POST' else request.args)
+        profile = params.get('profile', 'full')
+        if profile not in ANALYSIS_PROFILES:
+            return handle_error(f"profile must be one of: {', '.join(ANALYSIS_PROFILES)}")
+        try:
+            peaks_per_second = int(params.get('peaks_per_second', 50))
+        except (TypeError, ValueError):
+            return handle_error('peaks_per_second must be an integer')
+        if not 1 <= peaks_per_second <= 1000:
+            return handle_error('peaks_per_second must be between 1 and 1000')
+        offset, duration, error = parse_audio_window(params)
+        if error:
+            return error
+        
+        if 'file' in request.files:
+            audio_source = upload_source(request.files['file'])
+            audio_hash = hash_audio_source(audio_source)
+        elif params.get('audio_hash'):
+            audio_source = None
+            audio_hash = params.get('audio_hash')
+        else:
+            return handle_error('No file or audio_hash provided')
+        
+        source_key = audio_window_key(audio_hash, offset, duration)
+        bundle = feature_cache.get(source_key, profile, peaks_per_second)
+        if bundle is None:
+            if audio_source is None:
+                return handle_error('Unknown audio_hash, upload the file instead', 404)
+            features = audio_pool.run(
+                extract_audio_features, audio_source, None, profile, peaks_per_second, offset, duration
+            )
+            # The same pass produced the beat analysis, so later requests skip tracking
+            beat_cache.put(
+                beat_cache_key(source_key, profile), features['tempo'], features['beat_times'], features['duration']
+            )
+            encoded = encode_feature_bundle(features)
+            bundle = feature_cache.put(source_key, profile, peaks_per_second, encoded) or io.BytesIO(encoded)
+        
+        response = send_file(
+            bundle, mimetype=FEATURES_MIMETYPE, download_name='features.bin', conditional=True,
+            etag=FeatureCache.key(source_key, profile, peaks_per_second), max_age=31536000
+        )
+        response.headers['X-Audio-Hash'] = audio_hash
+        return response
+        
+    except WorkerPoolBusy as e:
+        return pool_busy_response(e)
+    except TimeoutError:
+        return handle_error('Audio analysis timed out', 504)
+    except Exception as e:
+        logger.error(f"Error extracting audio features: {str(e)}")
+        return handle_error(f'Error extracting audio features: {str(e)}', 500)
+
+@app.route('/api/audio/cache-stats', methods=['GET'])
+def audio_cache_stats():
+    """
+    Report beat-cache and render-cache size and hit/miss counters, and tempo ladder pre-render progress
+    ---
+    responses:
+      200:
+        description: Cache statistics
+    """
+    return jsonify({
+        'status': 'success',
+        'beat_cache': beat_cache.stats(),
+        'beatmap_cache': beatmap_cache.stats(),
+        'render_cache': render_cache.stats(),
+        'feature_cache': feature_cache.stats(),
+        'download_cache': download_cache.stats(),
+        'prerender': tempo_ladder.stats()
+    })
+
 @app.route('/api/process-document', methods=['POST'])
 def process_document():
     """
@@ -485,7 +1541,7 @@ def process_document():
     
     try:
         words_limit = int(request.form.get('words_limit', 100))
-        file_bytes = file.read()
+        file_bytes = upload_source(file)
         content_type = file.content_type
         
         # Extract text
@@ -506,40 +1562,6 @@ def process_document():
         logger.error(f"Error processing document: {str(e)}")
         return handle_error(f'Error processing document: {str(e)}', 500)
 
-def change_audio_speed_pydub(mp3_bytes, speed_factor=1.0):
-    """
-    Change audio speed using pydub.
-    
-    Args:
-        mp3_bytes (bytes): MP3 audio data
-        speed_factor (float): Speed multiplier (0.5 = half speed/slower, 2.0 = double speed/faster)
-    
-    Returns:
-        bytes: Modified MP3 audio data
-    """
-    # Load audio from bytes
-    audio = AudioSegment.from_file(io.BytesIO(mp3_bytes), format="mp3")
-    
-    # Change speed WITHOUT pitch change (time stretching)
-    # To SLOW DOWN (speed_factor < 1): INCREASE frame rate, then convert back
-    # To SPEED UP (speed_factor > 1): DECREASE frame rate, then convert back
-    
-    # CORRECTED: Divide by speed_factor (not multiply)
-    sound_with_altered_frame_rate = audio._spawn(
-        audio.raw_data, 
-        overrides={"frame_rate": int(audio.frame_rate * speed_factor)}
-    )
-    
-    # Convert back to standard frame rate
-    modified_audio = sound_with_altered_frame_rate.set_frame_rate(audio.frame_rate)
-    
-    # Export to bytes
-    output_buffer = io.BytesIO()
-    modified_audio.export(output_buffer, format='mp3', bitrate='192k')
-    output_buffer.seek(0)
-    
-    return output_buffer.read()
-
 @app.route('/api/audio/adjust-speed', methods=['POST'])
 def adjust_audio_speed():
     """
@@ -547,6 +1569,9 @@ def adjust_audio_speed():
     
     Request format:
     - Form data with 'audio' (MP3 file) and 'speed' (float, optional, default=1.0)
+    - 'format' (optional): output codec, 'mp3' (default), 'opus' (Ogg), 'aac' (m4a) or 'wav'
+    - 'bitrate' (optional): output bitrate such as '96k'; defaults to the codec's default
+    - 'offset' / 'duration' (optional): only render this window of the song, in seconds
     
     Returns:
         Modified audio file with adjusted speed
@@ -558,73 +1583,336 @@ def adjust_audio_speed():
             
         audio_file = request.files['audio']
         speed_factor = float(request.form.get('speed', 1.0))
+        output_format, bitrate, error = parse_output_format(request.form)
+        if error:
+            return error
+        offset, duration, error = parse_audio_window(request.form)
+        if error:
+            return error
         
         # Validate speed factor
         if not 0.5 <= speed_factor <= 2.0:
             return jsonify({'error': 'Speed factor must be between 0.5 and 2.0'}), 400
             
-        # Read the audio file
-        audio_bytes = audio_file.read()
+        # Spooled uploads are passed by path, so workers read the file directly
+        audio_bytes = upload_source(audio_file)
         
-        # Process the audio
-        modified_audio = change_audio_speed_pydub(audio_bytes, speed_factor)
+        # Serve a previous render of the same audio/speed/format from disk,
+        # otherwise process the audio in a worker process and store it
+        source_key = audio_window_key(hash_audio_source(audio_bytes), offset, duration)
+        codec = render_codec(output_format, bitrate)
+        ext = AUDIO_OUTPUT_FORMATS[output_format]['ext']
+        def render():
+            rendered = audio_pool.run(
+                change_audio_speed, audio_bytes, speed_factor, output_format, bitrate, offset, duration
+            )
+            return render_cache.put(source_key, speed_factor, codec, rendered, ext=ext) or rendered
         
-        # Create response with the modified audio
-        response = make_response(modified_audio)
-        response.headers['Content-Type'] = 'audio/mp3'
-        response.headers['Content-Disposition'] = 'attachment; filename=modified_audio.mp3'
+        modified_audio = render_cache.get(source_key, speed_factor, codec) or render()
         
-        return response
+        # Stream the modified audio (with Range support)
+        return cached_audio_response(
+            modified_audio, AUDIO_OUTPUT_FORMATS[output_format]['mimetype'], f'modified_audio.{ext}', render
+        )
         
+    except WorkerPoolBusy as e:
+        return pool_busy_response(e)
+    except TimeoutError:
+        return jsonify({'error': 'Audio processing timed out'}), 504
     except Exception as e:
         logger.error(f"Error processing audio: {str(e)}")
         return jsonify({'error': f'Error processing audio: {str(e)}'}), 500
 
-@app.route('/api/audio/process-youtube', methods=['POST'])
-def process_youtube_audio():
+def parse_youtube_request(data):
+    """
+    Validates the JSON body of the YouTube pipeline endpoints.
+
+    Returns:
+        tuple: (youtube_url, target_tempo, output_format, bitrate, error_response)
+            with error_response None when the request is valid.
+    """
+    data = data or {}
+    youtube_url = data.get('url')
+    
+    if not youtube_url:
+        return None, None, None, None, handle_error('YouTube URL is required', 400)
+    
     try:
-        data = request.get_json()
-        youtube_url = data.get('url')
         target_tempo = float(data.get('target_tempo', 120))
+    except (TypeError, ValueError):
+        return None, None, None, None, handle_error('target_tempo must be a number', 400)
         
-        if not youtube_url:
-            return handle_error('YouTube URL is required', 400)
-            
-        if not 40 <= target_tempo <= 240:
-            return handle_error('Target tempo must be between 40 and 240 BPM', 400)
+    if not 40 <= target_tempo <= 240:
+        return None, None, None, None, handle_error('Target tempo must be between 40 and 240 BPM', 400)
+    
+    output_format, bitrate, error = parse_output_format(data)
+    if error:
+        return None, None, None, None, error
+    
+    return youtube_url, target_tempo, output_format, bitrate, None
+
+
+def youtube_audio_response(audio_hash, pipeline, target_tempo, output_format, rerender):
+    """
+    Streams the adjusted YouTube audio with the analysis in X- headers. The
+    beat times are too long for a header on real songs; X-Beatmap-Url points
+    at the binary beatmap instead. rerender() renders the audio again if
+    the cached render was evicted in the meantime.
+    """
+    spec = AUDIO_OUTPUT_FORMATS[output_format]
+    
+    # Stream the audio data (with Range support)
+    response = cached_audio_response(
+        pipeline['audio'], spec['mimetype'], f"adjusted_audio_{target_tempo}bpm.{spec['ext']}", rerender
+    )
+    response.headers['X-Original-Tempo'] = str(pipeline['tempo'])
+    response.headers['X-Adjusted-Tempo'] = str(target_tempo)
+    response.headers['X-Speed-Factor'] = str(pipeline['speed_factor'])
+    response.headers['X-Beat-Count'] = str(len(pipeline['adjusted_beats']))
+    response.headers['X-Audio-Hash'] = audio_hash
+    response.headers['X-Beatmap-Url'] = url_for('get_beatmap', audio_hash=audio_hash, tempo=target_tempo)
+    return response
+
+
+def youtube_audio_source(youtube_url):
+    """
+    The path of the cached download, or its bytes when it could not be
+    cached. Like a spooled upload, a path keeps the audio out of the
+    request's memory and out of the pickled worker jobs.
+    """
+    download = download_youtube_audio(youtube_url, cache=download_cache, extractor=youtube_extractor)
+    return download.get('path') or download.get('audio')
+
+
+@app.route('/api/audio/process-youtube', methods=['POST'])
+def process_youtube_audio():
+    try:
+        youtube_url, target_tempo, output_format, bitrate, error = parse_youtube_request(request.get_json())
+        if error:
+            return error
 
         # Download audio from YouTube
-        mp3_bytes = stream_audio(youtube_url)
-        if not mp3_bytes:
+        audio_bytes = youtube_audio_source(youtube_url)
+        if not audio_bytes:
             return handle_error('Failed to download audio from YouTube', 500)
 
-        # Detect beats and get original tempo
-        original_tempo, beat_times = wav_beat_tracking_from_bytes(mp3_bytes)
-        
-        # Adjust beats to target tempo
-        adjusted_beats, speed_factor = beat_adjustment(original_tempo, beat_times, target_tempo)
-        
-        # Adjust audio speed
-        adjusted_audio = change_audio_speed_pydub(mp3_bytes, speed_factor)
-        
-        # Create a response with the audio data
-        response = make_response(adjusted_audio)
-        response.headers['Content-Type'] = 'audio/mp3'
-        response.headers['Content-Disposition'] = f'attachment; filename=adjusted_audio_{target_tempo}bpm.mp3'
-        response.headers['X-Original-Tempo'] = str(original_tempo)
-        response.headers['X-Adjusted-Tempo'] = str(target_tempo)
-        response.headers['X-Speed-Factor'] = str(speed_factor)
-        response.headers['X-Beat-Times'] = json.dumps(
-            adjusted_beats.tolist() if hasattr(adjusted_beats, 'tolist') else adjusted_beats
+        # Detect beats, adjust them and stretch the audio in a worker process
+        audio_hash, pipeline = run_beat_pipeline(
+            audio_bytes, target_tempo=target_tempo, format=output_format, bitrate=bitrate
         )
         
-        return response
+        return youtube_audio_response(
+            audio_hash, pipeline, target_tempo, output_format,
+            lambda: run_beat_pipeline(
+                audio_bytes, target_tempo=target_tempo, format=output_format, bitrate=bitrate
+            )[1]['audio']
+        )
         
+    except WorkerPoolBusy as e:
+        return pool_busy_response(e)
+    except TimeoutError:
+        return handle_error('Audio processing timed out', 504)
     except Exception as e:
         logger.error(f"Error processing YouTube audio: {str(e)}")
         return handle_error(f'Error processing audio: {str(e)}', 500)
 
 
+YOUTUBE_JOB_STAGES = ['download', 'analysis', 'render']
+
+def run_youtube_job(job, youtube_url, target_tempo, output_format='mp3', bitrate=None):
+    """
+    Background version of process-youtube, one timed stage at a time.
+
+    Analysis and render are separate worker jobs so their progress can be
+    reported; the render reuses the cached analysis and the render cache.
+    """
+    with job.stage('download'):
+        audio_bytes = youtube_audio_source(youtube_url)
+        if not audio_bytes:
+            raise RuntimeError('Failed to download audio from YouTube')
+    
+    with job.stage('analysis'):
+        audio_hash, analysis = run_beat_pipeline(audio_bytes, wait=True)
+    
+    with job.stage('render'):
+        _, pipeline = run_beat_pipeline(
+            audio_bytes, target_tempo=target_tempo, wait=True, format=output_format, bitrate=bitrate
+        )
+    
+    return {
+        'audio_hash': audio_hash,
+        'youtube_url': youtube_url,
+        'target_tempo': target_tempo,
+        'format': output_format,
+        'bitrate': bitrate,
+        'pipeline': pipeline,
+    }
+
+
+def job_status(job):
+    """Job snapshot plus links, and a result summary once it is done."""
+    status = job.snapshot()
+    status['events_url'] = url_for('audio_job_events', job_id=job.id)
+    if job.status == 'done':
+        pipeline = job.result['pipeline']
+        status['result_url'] = url_for('audio_job_result', job_id=job.id)
+        status['result'] = {
+            'audio_hash': job.result['audio_hash'],
+            'original_tempo': float(pipeline['tempo']),
+            'target_tempo': job.result['target_tempo'],
+            'format': job.result['format'],
+            'speed_factor': float(pipeline['speed_factor']),
+            'beat_count': len(pipeline['adjusted_beats']),
+            'beatmap_url': url_for(
+                'get_beatmap', audio_hash=job.result['audio_hash'], tempo=job.result['target_tempo']
+            ),
+        }
+    return status
+
+
+@app.route('/api/audio/jobs/process-youtube', methods=['POST'])
+def submit_youtube_job():
+    """
+    Start the YouTube pipeline as a background job
+    ---
+    parameters:
+      - name: url
+        in: body
+        type: string
+        required: true
+        description: YouTube URL
+      - name: target_tempo
+        in: body
+        type: number
+        required: false
+        default: 120
+        description: Target tempo in BPM (40-240)
+      - name: format
+        in: body
+        type: string
+        required: false
+        default: mp3
+        description: Output codec - mp3, opus (Ogg), aac (m4a) or wav
+      - name: bitrate
+        in: body
+        type: string
+        required: false
+        description: Output bitrate, e.g. 96k
+    responses:
+      202:
+        description: Job accepted; poll status_url, stream events_url, then fetch result_url
+      400:
+        description: Invalid input
+    """
+    youtube_url, target_tempo, output_format, bitrate, error = parse_youtube_request(request.get_json(silent=True))
+    if error:
+        return error
+    
+    job = audio_jobs.submit(
+        run_youtube_job, YOUTUBE_JOB_STAGES, youtube_url, target_tempo, output_format, bitrate
+    )
+    response = jsonify(dict(
+        job_status(job),
+        status_url=url_for('audio_job_status', job_id=job.id),
+        result_url=url_for('audio_job_result', job_id=job.id)
+    ))
+    response.status_code = 202
+    response.headers['Location'] = url_for('audio_job_status', job_id=job.id)
+    return response
+
+
+@app.route('/api/audio/jobs/<job_id>', methods=['GET'])
+def audio_job_status(job_id):
+    """
+    Current status of a background job, with per-stage status and timings
+    ---
+    responses:
+      200:
+        description: Job status
+      404:
+        description: Unknown or expired job
+    """
+    job = audio_jobs.get(job_id)
+    if job is None:
+        return handle_error('Job not found', 404)
+    return jsonify(job_status(job))
+
+
+@app.route('/api/audio/jobs/<job_id>/events', methods=['GET'])
+def audio_job_events(job_id):
+    """
+    Server-Sent Events stream of job progress
+    ---
+    responses:
+      200:
+        description: text/event-stream of "progress" events, ending with a "done" or "failed" event
+      404:
+        description: Unknown or expired job
+    """
+    job = audio_jobs.get(job_id)
+    if job is None:
+        return handle_error('Job not found', 404)
+    
+    def generate():
+        version = None
+        while True:
+            if version == job.version and not job.finished:
+                # Nothing new within the keep-alive interval
+                yield ': keep-alive\n\n'
+            else:
+                # Read the version before the snapshot so a change in between
+                # is sent on the next pass, and decide on the snapshot alone
+                version = job.version
+                status = job_status(job)
+                finished = status['status'] in ('done', 'failed')
+                event = status['status'] if finished else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(status)}\n\n"
+                if finished:
+                    return
+            job.wait_for_change(version, timeout=15)
+    
+    # url_for inside the generator needs the request context
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/audio/jobs/<job_id>/result', methods=['GET'])
+def audio_job_result(job_id):
+    """
+    Adjusted audio of a finished job (same headers as /api/audio/process-youtube)
+    ---
+    responses:
+      200:
+        description: Audio file
+      404:
+        description: Unknown or expired job
+      409:
+        description: Job has not finished yet
+      500:
+        description: Job failed
+    """
+    job = audio_jobs.get(job_id)
+    if job is None:
+        return handle_error('Job not found', 404)
+    if job.status == 'failed':
+        return handle_error(f'Error processing audio: {job.error}', 500)
+    if job.status != 'done':
+        response = jsonify(dict(job_status(job), error='Job has not finished yet'))
+        response.status_code = 409
+        response.headers['Retry-After'] = '2'
+        return response
+    result = job.result
+    return youtube_audio_response(
+        result['audio_hash'], result['pipeline'], result['target_tempo'], result['format'],
+        lambda: run_beat_pipeline(
+            youtube_audio_source(result['youtube_url']), target_tempo=result['target_tempo'],
+            format=result['format'], bitrate=result['bitrate']
+        )[1]['audio']
+    )
+
+
 @app.route('/')
 def index():
     """API documentation"""
@@ -658,15 +1946,50 @@ def index():
         </li>
         <li><strong>POST /api/audio/analyze</strong> - Analyze audio beats and tempo
             <ul>
-                <li>Form Data: file (required) - Audio file (MP3), target_tempo (optional) - Desired BPM (default: 120.0)</li>
+                <li>Form Data: file (required) - Audio file (MP3), target_tempo (optional) - Desired BPM (default: 120.0), profile (optional) - fast, balanced or full (default: full), chunked (optional) - bounded-memory analysis for long recordings, format/bitrate (optional) - codec of the adjusted audio, offset/duration (optional) - only process this window (seconds), with beat times relative to it, progressive (optional) - extrapolate the beat grid of steady songs from the first 30 s, reported as beat_tracking</li>
             </ul>
         </li>
         <li><strong>POST /api/audio/adjust-speed</strong> - Adjust audio speed
             <ul>
-                <li>Form Data: audio (required) - Audio file (MP3), speed (optional) - Speed factor (0.5-2.0, default: 1.0)</li>
+                <li>Form Data: audio (required) - Audio file (MP3), speed (optional) - Speed factor (0.5-2.0, default: 1.0), format (optional) - mp3, opus, aac or wav (default: mp3), bitrate (optional) - e.g. 96k, offset/duration (optional) - only render this window (seconds)</li>
             </ul>
         </li>
+        <li><strong>POST /api/audio/analyze-stream</strong> - Analyze audio and stream beats (NDJSON) as they are found
+            <ul>
+                <li>Form Data: file (required) - Audio file, profile (optional), first_seconds (optional) - the opening window sent first (default: 15)</li>
+            </ul>
+        </li>
+        <li><strong>POST /api/audio/analyze-tempos</strong> - Analyze once, get beat grids for many target tempos
+            <ul>
+                <li>Form Data / JSON: file or audio_hash (one required), target_tempos (required) - e.g. "90,120,150", profile (optional), offset/duration (optional) - analysis window</li>
+            </ul>
+        </li>
+        <li><strong>POST /api/audio/jobs/process-youtube</strong> - Run the YouTube pipeline in the background (202 with a job ID)
+            <ul>
+                <li>JSON: url (required) - YouTube URL, target_tempo (optional) - Desired BPM (default: 120), format/bitrate (optional) - output codec</li>
+                <li>GET /api/audio/jobs/&lt;job_id&gt; - status with per-stage timings (download, analysis, render)</li>
+                <li>GET /api/audio/jobs/&lt;job_id&gt;/events - Server-Sent Events progress stream</li>
+                <li>GET /api/audio/jobs/&lt;job_id&gt;/result - adjusted audio once the job is done (409 until then)</li>
+            </ul>
+        </li>
+        <li><strong>GET /api/audio/beatmap/&lt;audio_hash&gt;</strong> - Compact binary beat times (delta-encoded integer ms), cacheable
+            <ul>
+                <li>Query: tempo (optional) - beat times of the audio adjusted to this BPM, profile (optional), offset/duration (optional) - analysis window, encoding (optional) - varint or int32 (default: varint)</li>
+            </ul>
+        </li>
+        <li><strong>GET/POST /api/beatmap</strong> - Playable game chart (notes with time, lane and key hint) from the detected beats, cached per song, tempo and difficulty
+            <ul>
+                <li>file (POST) or audio_hash (one required), target_tempo (optional), difficulty (optional) - easy, normal or hard (default: normal), profile, offset/duration (optional)</li>
+            </ul>
+        </li>
+        <li><strong>GET/POST /api/audio/features</strong> - Tempo, beats, onset envelope, RMS loudness and waveform peaks from one analysis pass, as a cacheable float32 bundle
+            <ul>
+                <li>file (POST) or audio_hash (one required), profile (optional), peaks_per_second (optional, default: 50), offset/duration (optional)</li>
+            </ul>
+        </li>
+        <li><strong>GET /api/audio/cache-stats</strong> - Beat-tracking, rendered-audio and YouTube download cache sizes and hit/miss counters, plus tempo ladder pre-render progress (PRERENDER_TEMPOS, e.g. 60-180:10)</li>
     </ul>
+    <p>Audio responses are streamed in chunks and accept a single <code>Range: bytes=start-end</code> header (206 Partial Content).</p>
     
     <h2>Beat Tracking Endpoints:</h2>
     <ul>
@@ -694,7 +2017,7 @@ def index():
     curl -X POST -F "audio=@song.mp3" -F "speed=1.2" http://localhost:5000/api/audio/adjust-speed --output faster_song.mp3
     
     # Stream audio from YouTube
-    curl "http://localhost:5000/api/audio/stream?url=https://www.youtube.com/watch?v=..." --output audio.mp3
+    curl "http://localhost:5000/api/audio/stream?url=https://www.youtube.com/watch?v=..." --output audio.m4a
     </pre>
     '''
 
@@ -706,5 +2029,12 @@ if __name__ == '__main__':
     if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
         logger.warning("GOOGLE_APPLICATION_CREDENTIALS not set")
     
+    if not FFMPEG_BINARY:
+        logger.warning("ffmpeg not found; set FFMPEG_BINARY or add it to PATH")
+    
+    # Only the reloader's child serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        audio_pool.warm_up(warm_up_audio_worker)
+    
     # Run the app
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,558 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+
+def hash_audio_bytes(audio_bytes):
+    """
+    Returns the content address used as the cache key for an upload.
+
+    Args:
+        audio_bytes (bytes): The raw (compressed) audio data.
+
+    Returns:
+        str: Hex SHA-256 digest of the bytes.
+    """
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+def hash_audio_file(path):
+    """
+    Same content address as hash_audio_bytes, for a file on disk. The file
+    is memory-mapped, so hashing never copies it into the Python heap.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256(b'').hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+def hash_audio_source(audio):
+    """hash_audio_bytes for bytes, hash_audio_file for a path."""
+    return hash_audio_file(audio) if isinstance(audio, str) else hash_audio_bytes(audio)
+
+
+class BeatCache:
+    """
+    SQLite-backed LRU cache for beat-tracking results.
+
+    Entries are keyed by the hash of the uploaded audio bytes and hold the
+    tempo, beat times (as float32) and duration returned by the analysis.
+    When the cache grows past max_entries the least recently used rows are
+    evicted.
+    """
+
+    def __init__(self, path=None, max_entries=1000):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'beat_cache.db')
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            # Superseded by beat_analysis_f32; its float64 blobs would be misread
+            conn.execute("DROP TABLE IF EXISTS beat_analysis")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS beat_analysis_f32 (
+                    key TEXT PRIMARY KEY,
+                    tempo REAL NOT NULL,
+                    beat_times BLOB NOT NULL,
+                    duration REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_beat_analysis_f32_last_access ON beat_analysis_f32 (last_access)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """
+        Looks up a cached analysis and marks it as recently used.
+
+        Args:
+            key (str): Audio hash from hash_audio_bytes.
+
+        Returns:
+            dict | None: {'tempo', 'beat_times', 'duration'} or None on a miss.
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT tempo, beat_times, duration FROM beat_analysis_f32 WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE beat_analysis_f32 SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hits += 1
+
+        tempo, beat_blob, duration = row
+        return {
+            'tempo': tempo,
+            'beat_times': np.frombuffer(beat_blob, dtype=np.float32).copy(),
+            'duration': duration,
+        }
+
+    def put(self, key, tempo, beat_times, duration):
+        """
+        Stores an analysis result and evicts the least recently used entries
+        beyond max_entries.
+
+        Args:
+            key (str): Audio hash from hash_audio_bytes.
+            tempo (float): Estimated tempo in BPM.
+            beat_times (np.ndarray): Beat times in seconds.
+            duration (float): Duration of the analysed audio in seconds.
+        """
+        now = time.time()
+        beat_blob = np.asarray(beat_times, dtype=np.float32).tobytes()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO beat_analysis_f32 "
+                "(key, tempo, beat_times, duration, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, float(tempo), beat_blob, float(duration), now, now)
+            )
+            conn.execute(
+                "DELETE FROM beat_analysis_f32 WHERE key IN ("
+                "SELECT key FROM beat_analysis_f32 ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        """Returns entry count and hit/miss counters for this process."""
+        with self._lock, self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM beat_analysis_f32").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def beatmap_cache_key(source_key, profile, target_tempo, difficulty):
+    """Beatmap-cache key for an analysed song (or window), tempo and difficulty."""
+    tempo = f"{float(target_tempo):.2f}" if target_tempo else "original"
+    return f"{source_key}:{profile}:{tempo}:{difficulty}"
+
+
+class BeatmapCache:
+    """
+    SQLite-backed LRU cache for generated beatmaps.
+
+    Entries hold the finished JSON payload, keyed by beatmap_cache_key, so a
+    hit is returned as-is without recomputing or re-serialising the notes.
+    Shares the database file with BeatCache by default.
+    """
+
+    def __init__(self, path=None, max_entries=5000):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'beat_cache.db')
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS beatmaps (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_beatmaps_last_access ON beatmaps (last_access)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """
+        Args:
+            key (str): Key from beatmap_cache_key.
+
+        Returns:
+            str | None: The cached JSON payload, or None on a miss.
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT payload FROM beatmaps WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE beatmaps SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, payload):
+        """
+        Stores a JSON payload and evicts the least recently used entries
+        beyond max_entries.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO beatmaps (key, payload, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            conn.execute(
+                "DELETE FROM beatmaps WHERE key IN ("
+                "SELECT key FROM beatmaps ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        """Returns entry count and hit/miss counters for this process."""
+        with self._lock, self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM beatmaps").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class DiskCache:
+    """
+    On-disk file store with a SQLite index and LRU/age eviction.
+
+    Files live under directory/<first two chars of the name>/<name> and are
+    indexed with their size, a small JSON metadata blob and access times.
+    When the total size grows past max_bytes the least recently used files
+    are deleted; with max_age set, entries older than that many seconds are
+    treated as misses and removed. Hits are plain files, so they can be
+    served with send_file and the server's sendfile path instead of being
+    read back into memory.
+    """
+
+    def __init__(self, directory, max_bytes=1024 ** 3, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.path = os.path.join(self.directory, 'index.db')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    key TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    metadata TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_files_last_access ON files (last_access)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _file_path(self, filename):
+        return os.path.join(self.directory, filename[:2], filename)
+
+    def _remove(self, conn, key, filename):
+        try:
+            os.remove(self._file_path(filename))
+        except FileNotFoundError:
+            pass
+        conn.execute("DELETE FROM files WHERE key = ?", (key,))
+
+    def get(self, key):
+        """
+        Looks up a stored file and marks it as recently used.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            dict | None: The stored metadata plus 'path', or None on a miss.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT filename, metadata, created_at FROM files WHERE key = ?", (key,)
+            ).fetchone()
+            entry = None
+            if row is not None:
+                filename, metadata, created_at = row
+                path = self._file_path(filename)
+                if self.max_age is not None and now - created_at > self.max_age:
+                    self._remove(conn, key, filename)
+                elif not os.path.exists(path):
+                    # Removed behind our back; forget it
+                    conn.execute("DELETE FROM files WHERE key = ?", (key,))
+                else:
+                    entry = dict(json.loads(metadata) if metadata else {}, path=path)
+            if entry is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE files SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return entry
+
+    def contains(self, key):
+        """
+        Whether a live file is stored under key. Unlike get() this is not a
+        lookup: it counts neither a hit nor a miss and does not mark the
+        file as used, so probes that only decide whether to do work (such as
+        pre-rendering) leave the stats and the LRU order alone.
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT filename, created_at FROM files WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return False
+        filename, created_at = row
+        if self.max_age is not None and time.time() - created_at > self.max_age:
+            return False
+        return os.path.exists(self._file_path(filename))
+
+    def put(self, key, filename, source, metadata=None):
+        """
+        Stores a file and evicts expired and least recently used files
+        beyond max_bytes.
+
+        Args:
+            key (str): Cache key.
+            filename (str): Name to store the file under.
+            source (bytes | str): File contents, or the path of a file to move
+                into the cache (it should be on the same filesystem).
+            metadata (dict): JSON-serialisable data returned with the path.
+
+        Returns:
+            str | None: Path of the stored file, or None if the file alone is
+                larger than the quota and was not stored.
+        """
+        size = os.path.getsize(source) if isinstance(source, str) else len(source)
+        if size > self.max_bytes:
+            return None
+
+        path = self._file_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if isinstance(source, str):
+            shutil.move(source, path)
+        else:
+            # Write to a temp file and rename so readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(source)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files (key, filename, size, metadata, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, filename, size, json.dumps(metadata) if metadata else None, now, now)
+            )
+            self._evict(conn, now)
+        return path
+
+    def _evict(self, conn, now):
+        if self.max_age is not None:
+            for key, filename in conn.execute(
+                "SELECT key, filename FROM files WHERE created_at < ?", (now - self.max_age,)
+            ).fetchall():
+                self._remove(conn, key, filename)
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, filename, size in conn.execute(
+            "SELECT key, filename, size FROM files ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove(conn, key, filename)
+            total -= size
+
+    def stats(self):
+        """Returns file count, total size and hit/miss counters for this process."""
+        with self._lock, self._connect() as conn:
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def render_cache_key(source_hash, speed_factor, codec):
+    """
+    Content address of a rendered file: the source audio hash, the speed
+    factor (rounded so float noise maps to the same render) and the codec.
+    """
+    return f"{source_hash}-{float(speed_factor):.4f}-{codec}"
+
+
+class RenderCache(DiskCache):
+    """
+    Content-addressed store for rendered (time-stretched and encoded) audio,
+    keyed by (source hash, speed factor, codec).
+    """
+
+    def __init__(self, directory=None, max_bytes=1024 ** 3):
+        super().__init__(directory or os.path.join(DEFAULT_CACHE_DIR, 'renders'), max_bytes=max_bytes)
+
+    def get(self, source_hash, speed_factor, codec):
+        """
+        Args:
+            source_hash (str): Hash of the source audio from hash_audio_bytes.
+            speed_factor (float): Speed factor the audio was rendered at.
+            codec (str): Output format and settings, e.g. "mp3" or "opus-96k".
+
+        Returns:
+            str | None: Path of the rendered file, or None on a miss.
+        """
+        entry = super().get(render_cache_key(source_hash, speed_factor, codec))
+        return entry['path'] if entry is not None else None
+
+    def contains(self, source_hash, speed_factor, codec):
+        """Whether a render is stored, without counting a lookup; see DiskCache.contains."""
+        return super().contains(render_cache_key(source_hash, speed_factor, codec))
+
+    def put(self, source_hash, speed_factor, codec, audio_bytes, ext=None):
+        """
+        Args:
+            source_hash (str): Hash of the source audio from hash_audio_bytes.
+            speed_factor (float): Speed factor the audio was rendered at.
+            codec (str): Output format and settings, e.g. "mp3" or "opus-96k".
+            audio_bytes (bytes | str): The encoded audio, or the path of a
+                file holding it to move into the cache.
+            ext (str): File extension; defaults to codec.
+
+        Returns:
+            str | None: Path of the stored file, or None if it exceeds the quota.
+        """
+        key = render_cache_key(source_hash, speed_factor, codec)
+        return super().put(key, f"{key}.{ext or codec}", audio_bytes)
+
+
+class FeatureCache(DiskCache):
+    """
+    Encoded feature bundles (see beatmap_codec.encode_feature_bundle) keyed by
+    the analysed song or window, analysis profile and peak resolution.
+    """
+
+    def __init__(self, directory=None, max_bytes=256 * 1024 ** 2):
+        super().__init__(directory or os.path.join(DEFAULT_CACHE_DIR, 'features'), max_bytes=max_bytes)
+
+    @staticmethod
+    def key(source_key, profile, peaks_per_second):
+        return f"{source_key}-{profile}-{int(peaks_per_second)}"
+
+    def get(self, source_key, profile, peaks_per_second):
+        """
+        Returns:
+            str | None: Path of the bundle file, or None on a miss.
+        """
+        entry = super().get(self.key(source_key, profile, peaks_per_second))
+        return entry['path'] if entry is not None else None
+
+    def put(self, source_key, profile, peaks_per_second, bundle):
+        """
+        Returns:
+            str | None: Path of the stored file, or None if it exceeds the quota.
+        """
+        key = self.key(source_key, profile, peaks_per_second)
+        return super().put(key, f"{key}.bin", bundle)
+
+
+class DownloadCache(DiskCache):
+    """
+    Downloaded YouTube audio keyed by the canonical video ID, with the title
+    and duration kept alongside so a hit needs no call to YouTube at all.
+    Entries expire after max_age seconds (videos can be edited or removed).
+    """
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3, max_age=7 * 24 * 3600):
+        super().__init__(
+            directory or os.path.join(DEFAULT_CACHE_DIR, 'downloads'), max_bytes=max_bytes, max_age=max_age
+        )
+
+    def get(self, video_id):
+        """
+        Args:
+            video_id (str): Canonical YouTube video ID.
+
+        Returns:
+            dict | None: {'path', 'title', 'duration', 'ext'} or None on a miss.
+        """
+        return super().get(video_id)
+
+    def put(self, video_id, source, title=None, duration=None, ext='mp3'):
+        """
+        Args:
+            video_id (str): Canonical YouTube video ID.
+            source (bytes | str): Audio data, or the path of the downloaded file
+                to move into the cache.
+            title (str): Video title.
+            duration (float): Duration in seconds.
+            ext (str): File extension / container of the audio.
+
+        Returns:
+            str | None: Path of the stored file, or None if it exceeds the quota.
+        """
+        metadata = {'title': title, 'duration': duration, 'ext': ext}
+        return super().put(video_id, f"{video_id}.{ext}", source, metadata=metadata)
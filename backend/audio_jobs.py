@@ -0,0 +1,154 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class AudioJob:
+    """
+    One background job: an ordered list of stages, each with a status and
+    timing, plus the final result or error.
+
+    Every change bumps version and wakes up anyone waiting in wait_for_change,
+    which is what the progress stream is built on.
+    """
+
+    def __init__(self, stages):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.stages = [{'name': name, 'status': 'pending', 'seconds': None} for name in stages]
+        self.result = None
+        self.error = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def _update(self, **changes):
+        with self._changed:
+            for key, value in changes.items():
+                setattr(self, key, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def _stage(self, name):
+        for stage in self.stages:
+            if stage['name'] == name:
+                return stage
+        raise KeyError(f"Unknown stage: {name}")
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Marks a stage as running for the duration of the with block and
+        records how long it took; an exception marks it as failed.
+        """
+        stage = self._stage(name)
+        started = time.perf_counter()
+        stage['status'] = 'running'
+        self._update(status='running')
+        try:
+            yield stage
+        except Exception:
+            stage['status'] = 'failed'
+            stage['seconds'] = round(time.perf_counter() - started, 3)
+            self._update()
+            raise
+        stage['status'] = 'done'
+        stage['seconds'] = round(time.perf_counter() - started, 3)
+        self._update()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def wait_for_change(self, version, timeout=None):
+        """
+        Blocks until the job changes past version, finishes, or the timeout
+        expires.
+
+        Returns:
+            int: The current version.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version or self.finished, timeout=timeout)
+            return self.version
+
+    def snapshot(self):
+        """JSON-serialisable view of the job's progress."""
+        with self._changed:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+                'stages': [dict(stage) for stage in self.stages],
+                'error': self.error,
+            }
+
+
+class JobManager:
+    """
+    Runs long audio pipelines in background threads and keeps their state
+    in memory so clients can poll or stream progress and fetch the result
+    later instead of holding a request open.
+
+    The heavy stages still run in the audio worker pool; these threads
+    mostly wait on it. Finished jobs are dropped after ttl seconds, and at
+    most max_jobs are kept (oldest finished first).
+    """
+
+    def __init__(self, max_workers=4, max_jobs=200, ttl=3600):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='audio-job')
+
+    def submit(self, fn, stages, *args, **kwargs):
+        """
+        Starts fn(job, *args, **kwargs) in the background.
+
+        Args:
+            fn (callable): Runs the pipeline, using job.stage(name) around each
+                stage, and returns the result.
+            stages (list): Stage names, in order.
+
+        Returns:
+            AudioJob: The new job.
+        """
+        job = AudioJob(stages)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        try:
+            result = fn(job, *args, **kwargs)
+        except Exception as e:
+            job._update(status='failed', error=str(e), finished_at=time.time())
+        else:
+            job._update(status='done', result=result, finished_at=time.time())
+
+    def get(self, job_id):
+        """Returns the job, or None if it is unknown or has expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at
+        )
+        for job in finished[:max(0, len(self._jobs) - self.max_jobs + 1)]:
+            del self._jobs[job.id]
@@ -0,0 +1,169 @@
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from api_calls import beat_adjustment, change_audio_speed, decode_audio_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def parse_tempo_ladder(spec):
+    """
+    Parses a tempo ladder: "60-180:10" (start-stop:step, inclusive) or a
+    comma-separated list such as "90,120,150". An empty spec is no ladder.
+
+    Returns:
+        list: Target tempos in BPM.
+    """
+    spec = (spec or '').strip()
+    if not spec:
+        return []
+    if '-' in spec:
+        bounds, _, step = spec.partition(':')
+        start, stop = (float(v) for v in bounds.split('-', 1))
+        step = float(step or 10)
+        if step <= 0 or stop < start:
+            raise ValueError(f"Invalid tempo ladder: {spec}")
+        return [float(t) for t in np.arange(start, stop + step / 2, step)]
+    return [float(v) for v in spec.split(',') if v.strip()]
+
+
+def render_speed_ladder(audio_bytes, speed_factors, format='mp3', bitrate=None, directory=None):
+    """
+    Decodes a song once and renders it at each speed factor. Runs on a
+    worker; each render is written to a temp file in directory (the render
+    cache's, so storing it is a rename) and only its path goes back.
+
+    Returns:
+        list: Per speed factor, {'path': ...} or {'error': ...} if it failed.
+    """
+    decoded = decode_audio_bytes(audio_bytes)
+    results = []
+    for speed_factor in speed_factors:
+        try:
+            rendered = change_audio_speed(decoded, speed_factor, format, bitrate)
+            with tempfile.NamedTemporaryFile(delete=False, dir=directory, prefix='ladder-', suffix='.tmp') as out:
+                out.write(rendered)
+            results.append({'path': out.name})
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results
+
+
+class TempoLadderPrerenderer:
+    """
+    Renders a song at a ladder of preset tempos in the background after its
+    first analysis, so picking a preset is a render-cache hit.
+
+    Ladders run one at a time on a single thread, and each ladder is one
+    job on its own low-priority worker pool, which decodes the song once for
+    all its tempos. Pre-rendering therefore never takes a slot from a
+    request and only uses otherwise idle CPU. Tempos that are already
+    cached are skipped. At most max_pending songs wait; beyond that new songs
+    are not pre-rendered.
+    """
+
+    def __init__(self, pool, render_cache, tempos, format='mp3', bitrate=None, codec=None, ext=None,
+                 max_pending=8):
+        self.pool = pool
+        self.render_cache = render_cache
+        self.tempos = list(tempos)
+        self.format = format
+        self.bitrate = bitrate
+        self.codec = codec or format
+        self.ext = ext
+        self.max_pending = max_pending
+        self.rendered = 0
+        self.skipped = 0
+        self.failed = 0
+
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tempo-ladder')
+
+    @property
+    def enabled(self):
+        return bool(self.tempos)
+
+    def schedule(self, audio_hash, audio_bytes, tempo, beat_times):
+        """
+        Queues the ladder for a freshly analysed song. audio_bytes may be the
+        path of a spooled upload; the request removes that on close, so the
+        ladder takes a hard link to it (no copy in the request thread).
+
+        Returns:
+            bool: Whether it was queued (False when disabled, already queued
+                or the queue is full).
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            if audio_hash in self._pending or len(self._pending) >= self.max_pending:
+                return False
+            self._pending.add(audio_hash)
+        if isinstance(audio_bytes, str):
+            link = f"{audio_bytes}.ladder"
+            try:
+                os.link(audio_bytes, link)
+            except OSError as e:
+                logger.warning(f"Not pre-rendering {audio_hash[:12]}: {e}")
+                with self._lock:
+                    self._pending.discard(audio_hash)
+                return False
+            audio_bytes = link
+        self._executor.submit(self._run, audio_hash, audio_bytes, tempo, beat_times)
+        return True
+
+    def _run(self, audio_hash, audio_bytes, tempo, beat_times):
+        try:
+            missing = {}
+            for target_tempo in self.tempos:
+                _, speed_factor = beat_adjustment(tempo, beat_times, target_tempo)
+                if self.render_cache.contains(audio_hash, speed_factor, self.codec):
+                    self.skipped += 1
+                else:
+                    missing[target_tempo] = speed_factor
+            if not missing:
+                return
+            try:
+                results = self.pool.run(
+                    render_speed_ladder, audio_bytes, list(missing.values()), self.format, self.bitrate,
+                    self.render_cache.directory, timeout=self.pool.timeout * len(missing), wait=True
+                )
+            except Exception as e:
+                self.failed += len(missing)
+                logger.warning(f"Pre-render of {audio_hash[:12]} failed: {e}")
+                return
+            for (target_tempo, speed_factor), result in zip(missing.items(), results):
+                if 'error' in result:
+                    self.failed += 1
+                    logger.warning(
+                        f"Pre-render of {audio_hash[:12]} at {target_tempo:g} BPM failed: {result['error']}"
+                    )
+                    continue
+                if self.render_cache.put(audio_hash, speed_factor, self.codec, result['path'], ext=self.ext):
+                    self.rendered += 1
+                elif os.path.exists(result['path']):
+                    # Larger than the whole quota, so it was not moved in
+                    os.remove(result['path'])
+        finally:
+            if isinstance(audio_bytes, str):
+                os.remove(audio_bytes)
+            with self._lock:
+                self._pending.discard(audio_hash)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'tempos': self.tempos,
+            'codec': self.codec,
+            'pending': pending,
+            'rendered': self.rendered,
+            'skipped': self.skipped,
+            'failed': self.failed,
+        }
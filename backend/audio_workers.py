@@ -0,0 +1,194 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _lower_priority(niceness):
+    # os.nice is Unix-only; elsewhere the workers keep normal priority
+    if hasattr(os, 'nice'):
+        os.nice(niceness)
+
+
+class WorkerPoolBusy(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Audio workers are busy, please retry later")
+        self.retry_after = retry_after
+
+
+class AudioWorkerPool:
+    """
+    Bounded process pool for the CPU-bound audio stages (decode, beat
+    tracking, time stretching, encoding).
+
+    Running these stages in separate processes keeps librosa/pydub work off
+    the Flask request threads and out of the GIL. At most max_workers jobs run
+    at once and at most max_queue more wait for a worker; beyond that submit
+    raises WorkerPoolBusy so the endpoint can answer 503 straight away.
+
+    A positive niceness lowers the scheduling priority of the worker
+    processes, for background work that should only use idle CPU.
+
+    A job that is still running when its timeout expires (e.g. a hung
+    ffmpeg) cannot be interrupted, so its workers are recycled: new jobs go
+    to a fresh set of processes and the old ones are terminated. Jobs still
+    running on the old processes fail with BrokenProcessPool.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None, timeout=120, retry_after=5, niceness=0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = self.max_workers * 2 if max_queue is None else max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.niceness = niceness
+
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._warmed_up = False
+
+    def _get_executor(self):
+        # Created lazily so importing the app (and the debug reloader) does not
+        # spawn workers. Spawned rather than forked: forking a threaded Flask
+        # process with numba/BLAS state loaded can deadlock the child.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_lower_priority if self.niceness else None,
+                    initargs=(self.niceness,) if self.niceness else ()
+                )
+            return self._executor
+
+    def warm_up(self, fn, *args):
+        """
+        Starts every worker ahead of the first request by running fn once
+        per worker in the background, e.g. to import and JIT-compile the
+        audio stack. Returns straight away; later calls do nothing. The
+        warm-up jobs bypass the queue limit, as no request can be waiting yet.
+        """
+        with self._lock:
+            if self._warmed_up:
+                return
+            self._warmed_up = True
+        executor = self._get_executor()
+
+        def run():
+            # Submitted together so the executor spawns all workers at once
+            futures = [executor.submit(fn, *args) for _ in range(self.max_workers)]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    pass
+
+        threading.Thread(target=run, name='audio-pool-warm-up', daemon=True).start()
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _recycle(self, executor):
+        # ProcessPoolExecutor has no way to stop one running job, and losing
+        # any worker breaks the whole executor, so replace it and terminate
+        # all its processes
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    def submit(self, fn, *args, wait=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs) on a worker process.
+
+        Args:
+            fn (callable): A module-level (picklable) function.
+            wait (float): Seconds to wait for a free slot when the pool and
+                its queue are full; by default fail straight away. Background
+                jobs wait, request handlers should not.
+
+        Returns:
+            concurrent.futures.Future: The pending job.
+
+        Raises:
+            WorkerPoolBusy: If the pool and its queue are (still) full.
+        """
+        acquired = self._slots.acquire(timeout=wait) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise WorkerPoolBusy(self.retry_after)
+
+        try:
+            executor = self._get_executor()
+            future = executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM kill); start a fresh pool and retry once
+            self._reset_executor()
+            try:
+                executor = self._get_executor()
+                future = executor.submit(fn, *args, **kwargs)
+            except Exception:
+                self._slots.release()
+                raise
+        except Exception:
+            self._slots.release()
+            raise
+
+        future._audio_pool_executor = executor
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def result(self, future, timeout=None):
+        """
+        Waits for a job from submit(). On timeout a job that has not started
+        is cancelled, and the workers of one that is running are recycled
+        (see the class docstring), so a stuck job gives its slot back.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the job did not finish in time.
+        """
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except TimeoutError:
+            if not future.cancel() and not future.done():
+                self._recycle(future._audio_pool_executor)
+            raise
+        except BrokenProcessPool:
+            self._recycle(future._audio_pool_executor)
+            raise
+
+    def run(self, fn, *args, timeout=None, wait=False, **kwargs):
+        """
+        Runs fn on a worker and waits for its result, see result().
+
+        Args:
+            fn (callable): A module-level (picklable) function.
+            timeout (float): Seconds to wait; defaults to the pool timeout.
+            wait (bool): Wait up to the timeout for a free slot instead of
+                raising WorkerPoolBusy straight away.
+
+        Returns:
+            The return value of fn.
+
+        Raises:
+            WorkerPoolBusy: If the pool and its queue are full.
+            concurrent.futures.TimeoutError: If the job did not finish in time.
+        """
+        timeout = timeout or self.timeout
+        future = self.submit(fn, *args, wait=timeout if wait else None, **kwargs)
+        return self.result(future, timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,167 @@
+import json
+import struct
+
+import numpy as np
+
+# Layout (little-endian):
+#   magic    4 bytes  b"RNBM"
+#   version  uint8    1
+#   encoding uint8    ENCODING_INT32 or ENCODING_VARINT
+#   count    uint32   number of beats
+#   deltas            beat times in integer milliseconds, each stored as the
+#                     difference to the previous beat (the first one to 0)
+#
+# int32 deltas are 4 bytes per beat; varint (unsigned LEB128) deltas take
+# 2 bytes for any gap between 128 ms and 16 s, which covers every real tempo.
+BEATMAP_MAGIC = b"RNBM"
+BEATMAP_VERSION = 1
+BEATMAP_MIMETYPE = 'application/vnd.rhythm-notes.beatmap'
+ENCODING_INT32 = 0
+ENCODING_VARINT = 1
+BEATMAP_ENCODINGS = {'int32': ENCODING_INT32, 'varint': ENCODING_VARINT}
+
+_HEADER = struct.Struct('<4sBBI')
+_MAX_VARINT_BYTES = 5
+
+
+def beat_times_to_ms(beat_times):
+    """Rounds beat times in seconds to sorted int32 milliseconds."""
+    beat_ms = np.rint(np.asarray(beat_times, dtype=np.float64) * 1000.0)
+    return np.sort(np.maximum(beat_ms, 0)).astype(np.int32)
+
+
+def _encode_varints(values):
+    """Unsigned LEB128 encoding of a non-negative int array, vectorised per byte position."""
+    values = values.astype(np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for i in range(1, _MAX_VARINT_BYTES):
+        n_bytes += values >= (1 << (7 * i))
+    offsets = np.cumsum(n_bytes) - n_bytes
+
+    out = np.empty(int(n_bytes.sum()), dtype=np.uint8)
+    for i in range(_MAX_VARINT_BYTES):
+        present = n_bytes > i
+        if not present.any():
+            break
+        payload = (values[present] >> np.uint64(7 * i)) & np.uint64(0x7F)
+        more = (n_bytes[present] > i + 1).astype(np.uint64) << np.uint64(7)
+        out[offsets[present] + i] = payload | more
+    return out.tobytes()
+
+
+def _decode_varints(data, count):
+    """Decodes count unsigned LEB128 values from the start of data."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(raw < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError("Truncated beatmap")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    values = np.zeros(count, dtype=np.int64)
+    for i in range(_MAX_VARINT_BYTES):
+        present = starts + i <= ends
+        if not present.any():
+            break
+        values[present] |= (raw[starts[present] + i].astype(np.int64) & 0x7F) << (7 * i)
+    return values
+
+
+def encode_beatmap(beat_times, encoding='varint'):
+    """
+    Packs beat times into the compact binary beatmap format.
+
+    Args:
+        beat_times (array-like): Beat times in seconds.
+        encoding (str): 'varint' (default, smallest) or 'int32' (fixed width).
+
+    Returns:
+        bytes: The encoded beatmap.
+    """
+    if encoding not in BEATMAP_ENCODINGS:
+        raise ValueError(f"encoding must be one of: {', '.join(BEATMAP_ENCODINGS)}")
+
+    beat_ms = beat_times_to_ms(beat_times)
+    deltas = np.diff(beat_ms, prepend=0)
+    header = _HEADER.pack(BEATMAP_MAGIC, BEATMAP_VERSION, BEATMAP_ENCODINGS[encoding], len(beat_ms))
+    if encoding == 'int32':
+        return header + deltas.astype('<i4').tobytes()
+    return header + _encode_varints(deltas)
+
+
+def decode_beatmap(data):
+    """
+    Unpacks a binary beatmap.
+
+    Returns:
+        np.ndarray: Beat times in int32 milliseconds.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Truncated beatmap")
+    magic, version, encoding, count = _HEADER.unpack_from(data)
+    if magic != BEATMAP_MAGIC or version != BEATMAP_VERSION:
+        raise ValueError("Not a version 1 beatmap")
+
+    body = data[_HEADER.size:]
+    if encoding == ENCODING_INT32:
+        if len(body) < 4 * count:
+            raise ValueError("Truncated beatmap")
+        deltas = np.frombuffer(body, dtype='<i4', count=count).astype(np.int64)
+    elif encoding == ENCODING_VARINT:
+        deltas = _decode_varints(body, count) if count else np.zeros(0, dtype=np.int64)
+    else:
+        raise ValueError(f"Unknown beatmap encoding: {encoding}")
+    return np.cumsum(deltas).astype(np.int32)
+
+
+# Feature bundles (extract_audio_features) use a JSON header followed by
+# little-endian float32 arrays, each 4-byte aligned so a client can view
+# them in place (e.g. as a JS Float32Array):
+#   magic       4 bytes  b"RNFB"
+#   header_len  uint32   length of the JSON header, padded to a multiple of 4
+#   header      JSON     scalars plus {"name", "offset", "length"} per array,
+#                        offsets counted in bytes from the start of the data
+#   data                 the float32 arrays back to back
+FEATURES_MAGIC = b"RNFB"
+FEATURES_MIMETYPE = 'application/vnd.rhythm-notes.features'
+FEATURE_ARRAYS = ('beat_times', 'onset_envelope', 'rms', 'peaks')
+FEATURE_SCALARS = ('tempo', 'duration', 'sample_rate', 'frame_rate', 'peaks_per_second')
+
+
+def encode_feature_bundle(features):
+    """
+    Packs the output of extract_audio_features into one binary bundle.
+
+    Returns:
+        bytes: The encoded bundle.
+    """
+    arrays = [np.ascontiguousarray(features[name], dtype='<f4') for name in FEATURE_ARRAYS]
+    header = {name: features[name] for name in FEATURE_SCALARS}
+    header['arrays'] = []
+    offset = 0
+    for name, array in zip(FEATURE_ARRAYS, arrays):
+        header['arrays'].append({'name': name, 'offset': offset, 'length': len(array)})
+        offset += array.nbytes
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    header_bytes += b' ' * (-len(header_bytes) % 4)
+    return b''.join([FEATURES_MAGIC, struct.pack('<I', len(header_bytes)), header_bytes]
+                    + [array.tobytes() for array in arrays])
+
+
+def decode_feature_bundle(data):
+    """
+    Unpacks a feature bundle.
+
+    Returns:
+        dict: The header scalars plus one float32 array per feature.
+    """
+    if len(data) < 8 or data[:4] != FEATURES_MAGIC:
+        raise ValueError("Not a feature bundle")
+    header_len = struct.unpack_from('<I', data, 4)[0]
+    header = json.loads(bytes(data[8:8 + header_len]))
+    start = 8 + header_len
+    features = {name: header[name] for name in FEATURE_SCALARS}
+    for entry in header['arrays']:
+        features[entry['name']] = np.frombuffer(
+            data, dtype='<f4', count=entry['length'], offset=start + entry['offset']
+        )
+    return features
@@ -0,0 +1,36 @@
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+# The backend modules are imported as top-level modules, as app.py does
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Keep importing app.py from touching the real caches and database
+_state_dir = tempfile.mkdtemp(prefix='rhythm-notes-tests-')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+os.environ.setdefault('BEAT_CACHE_PATH', os.path.join(_state_dir, 'beat_cache.db'))
+os.environ.setdefault('RENDER_CACHE_DIR', os.path.join(_state_dir, 'renders'))
+os.environ.setdefault('FEATURE_CACHE_DIR', os.path.join(_state_dir, 'features'))
+os.environ.setdefault('YOUTUBE_CACHE_DIR', os.path.join(_state_dir, 'downloads'))
+os.environ.setdefault('UPLOAD_SPOOL_DIR', _state_dir)
+os.environ['AUDIO_POOL_WARMUP'] = 'false'
+
+
+@pytest.fixture(scope='session')
+def click_wav():
+    """Factory for WAV bytes of 20 ms 1 kHz clicks: click_wav(bpm, seconds)."""
+    def make(bpm, seconds, sample_rate=22050, first=0.25):
+        audio = np.zeros(int(seconds * sample_rate), dtype=np.float32)
+        click = np.sin(2 * np.pi * 1000 * np.arange(int(0.02 * sample_rate)) / sample_rate)
+        for start in (np.arange(first, seconds - 0.1, 60.0 / bpm) * sample_rate).astype(int):
+            audio[start:start + len(click)] = click[:len(audio) - start]
+        buffer = io.BytesIO()
+        sf.write(buffer, audio, sample_rate, format='WAV')
+        return buffer.getvalue()
+    return make
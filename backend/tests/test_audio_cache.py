@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import audio_cache
+from audio_cache import DiskCache, RenderCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(audio_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_lru_eviction(tmp_path, clock):
+    cache = DiskCache(str(tmp_path), max_bytes=25)
+    paths = {}
+    for key in ('a', 'b'):
+        paths[key] = cache.put(key, f'{key}.bin', key.encode() * 10)
+        clock[0] += 1
+    # Touch 'a' so 'b' is the least recently used
+    assert cache.get('a')['path'] == paths['a']
+    clock[0] += 1
+
+    cache.put('c', 'c.bin', b'c' * 10)
+    assert cache.get('b') is None
+    assert not os.path.exists(paths['b'])
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.stats()['bytes'] == 20
+
+
+def test_age_eviction(tmp_path, clock):
+    cache = DiskCache(str(tmp_path), max_age=60)
+    path = cache.put('a', 'a.bin', b'audio', metadata={'codec': 'mp3'})
+    clock[0] += 60
+    assert cache.get('a') == {'codec': 'mp3', 'path': path}
+
+    clock[0] += 1
+    assert cache.get('a') is None
+    assert not os.path.exists(path)
+    assert cache.stats()['entries'] == 0
+
+
+def test_expired_entries_removed_on_put(tmp_path, clock):
+    cache = DiskCache(str(tmp_path), max_age=60)
+    old = cache.put('a', 'a.bin', b'audio')
+    clock[0] += 61
+    cache.put('b', 'b.bin', b'audio')
+    assert not os.path.exists(old)
+    assert cache.stats()['entries'] == 1
+
+
+def test_oversize_file_not_stored(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=4)
+    assert cache.put('a', 'a.bin', b'too large') is None
+    assert cache.get('a') is None
+
+
+def test_file_removed_behind_cache_is_miss(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    os.remove(cache.put('a', 'a.bin', b'audio'))
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_render_cache_key(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    path = cache.put('abc', 1.25, 'opus-96k', b'ogg', ext='ogg')
+    assert path.endswith('abc-1.2500-opus-96k.ogg')
+    # Float noise in the speed factor maps to the same render
+    assert cache.get('abc', 1.2500000001, 'opus-96k') == path
+    assert cache.get('abc', 1.25, 'mp3') is None
+    with open(path, 'rb') as f:
+        assert f.read() == b'ogg'
@@ -0,0 +1,121 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import api_calls
+from api_calls import _read_pcm_into, decode_audio_bytes, iter_audio_blocks
+
+SAMPLE_RATE = 22050
+
+
+@pytest.fixture(scope='module')
+def stereo():
+    t = np.arange(SAMPLE_RATE * 3) / SAMPLE_RATE
+    left = 0.5 * np.sin(2 * np.pi * 440 * t)
+    right = 0.25 * np.sin(2 * np.pi * 660 * t)
+    return np.column_stack((left, right)).astype(np.float32)
+
+
+@pytest.fixture(scope='module')
+def wav_bytes(stereo):
+    buffer = io.BytesIO()
+    sf.write(buffer, stereo, SAMPLE_RATE, format='WAV', subtype='FLOAT')
+    return buffer.getvalue()
+
+
+@pytest.fixture(params=['bytes', 'path'])
+def source(request, wav_bytes, tmp_path):
+    if request.param == 'bytes':
+        return wav_bytes
+    path = tmp_path / 'upload.wav'
+    path.write_bytes(wav_bytes)
+    return str(path)
+
+
+@pytest.fixture(params=['libsndfile', 'ffmpeg'])
+def decoder(request, monkeypatch):
+    if request.param == 'libsndfile':
+        monkeypatch.setattr(api_calls, 'FFMPEG_BINARY', None)
+    elif not (api_calls.FFMPEG_BINARY and api_calls.FFPROBE_BINARY):
+        pytest.skip('ffmpeg is not installed')
+    return request.param
+
+
+class ChunkedStream:
+    """Pipe stand-in that hands out at most chunk bytes per readinto call."""
+
+    def __init__(self, data, chunk):
+        self.data = memoryview(data)
+        self.chunk = chunk
+
+    def readinto(self, view):
+        n = min(len(view), self.chunk, len(self.data))
+        view[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+
+@pytest.mark.parametrize('expected_frames', [0, 7, 1000, 5000])
+def test_read_pcm_into_any_estimate(stereo, expected_frames):
+    samples = stereo[:1000]
+    read = _read_pcm_into(ChunkedStream(samples.tobytes(), 333), 2, expected_frames)
+    assert read.dtype == np.float32
+    np.testing.assert_array_equal(read, samples)
+
+
+def test_read_pcm_into_drops_partial_frame():
+    data = np.arange(6, dtype=np.float32).tobytes() + b'\x00\x00'
+    assert _read_pcm_into(ChunkedStream(data, 4), 2, 1).shape == (3, 2)
+
+
+def test_decode(decoder, source, stereo):
+    decoded = decode_audio_bytes(source)
+    assert decoded.sample_rate == SAMPLE_RATE
+    assert decoded.channels == 2
+    assert decoded.samples.dtype == np.float32
+    np.testing.assert_allclose(decoded.samples, stereo, atol=1e-6)
+    assert decoded.duration == pytest.approx(3.0)
+
+
+def test_decode_window(decoder, source, stereo):
+    decoded = decode_audio_bytes(source, offset=1.0, duration=0.5)
+    start = SAMPLE_RATE
+    assert abs(decoded.frames - SAMPLE_RATE // 2) <= 1
+    np.testing.assert_allclose(decoded.samples[:100], stereo[start:start + 100], atol=1e-4)
+
+
+def test_decode_mono_and_resampled(decoder, source, stereo):
+    decoded = decode_audio_bytes(source, sample_rate=11025, channels=1)
+    assert decoded.sample_rate == 11025
+    assert decoded.channels == 1
+    assert abs(decoded.frames - len(stereo) // 2) <= 64
+    # Mean of a 0.5 and a 0.25 amplitude sine at different pitches
+    assert 0.3 < np.abs(decoded.samples).max() <= 0.76
+
+
+def test_source_hash_is_lazy(monkeypatch, wav_bytes):
+    monkeypatch.setattr(api_calls, 'FFMPEG_BINARY', None)
+    calls = []
+    real_hash = api_calls.hash_audio_source
+    monkeypatch.setattr(api_calls, 'hash_audio_source', lambda audio: calls.append(1) or real_hash(audio))
+
+    decoded = decode_audio_bytes(wav_bytes, offset=1.0)
+    assert calls == []
+    assert decoded.source_hash == f"{real_hash(wav_bytes)}@1.000"
+    assert decoded.source_hash == f"{real_hash(wav_bytes)}@1.000"
+    assert len(calls) == 1
+    assert decode_audio_bytes(wav_bytes, audio_hash='abc').source_hash == 'abc'
+
+
+def test_blocks_match_whole_decode(decoder, source, stereo):
+    blocks = list(iter_audio_blocks(source, block_seconds=0.7))
+    assert all(rate == SAMPLE_RATE for rate, _ in blocks)
+    mono = np.concatenate([block.copy() for _, block in blocks])
+    np.testing.assert_allclose(mono, stereo.mean(axis=1), atol=1e-6)
+
+
+def test_undecodable_input(decoder):
+    with pytest.raises(RuntimeError):
+        decode_audio_bytes(b'not audio at all' * 100)
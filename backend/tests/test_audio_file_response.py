@@ -0,0 +1,80 @@
+import pytest
+
+from app import app, audio_file_response, hash_audio_bytes
+
+AUDIO = bytes(range(256)) * 40
+
+
+@pytest.fixture(params=['bytes', 'path'])
+def audio(request, tmp_path):
+    if request.param == 'bytes':
+        return AUDIO
+    path = tmp_path / 'render1234.mp3'
+    path.write_bytes(AUDIO)
+    return str(path)
+
+
+def respond(audio, headers=None):
+    with app.test_request_context('/', method='POST', headers=headers or {}):
+        response = audio_file_response(audio, 'audio/mpeg', 'out.mp3', etag='tag')
+        body = b''.join(response.response) if response.status_code != 416 else b''
+        if hasattr(response.response, 'close'):
+            response.response.close()
+        return response, body
+
+
+def test_full_body(audio):
+    response, body = respond(audio)
+    assert response.status_code == 200
+    assert body == AUDIO
+    assert response.headers['Content-Length'] == str(len(AUDIO))
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] == '"tag"'
+
+
+@pytest.mark.parametrize('spec, start, stop', [
+    ('bytes=0-0', 0, 1),
+    ('bytes=100-1123', 100, 1124),
+    ('bytes=10000-', 10000, len(AUDIO)),
+    ('bytes=-240', len(AUDIO) - 240, len(AUDIO)),
+    ('bytes=10000-99999', 10000, len(AUDIO)),
+])
+def test_single_range(audio, spec, start, stop):
+    response, body = respond(audio, {'Range': spec})
+    assert response.status_code == 206
+    assert body == AUDIO[start:stop]
+    assert response.headers['Content-Length'] == str(stop - start)
+    assert response.headers['Content-Range'] == f'bytes {start}-{stop - 1}/{len(AUDIO)}'
+
+
+@pytest.mark.parametrize('spec', [f'bytes={len(AUDIO)}-', 'bytes=20000-20010'])
+def test_unsatisfiable_range(audio, spec):
+    response, _ = respond(audio, {'Range': spec})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(AUDIO)}'
+
+
+def test_if_range(audio):
+    response, body = respond(audio, {'Range': 'bytes=0-9', 'If-Range': '"tag"'})
+    assert response.status_code == 206
+    assert body == AUDIO[:10]
+
+    response, body = respond(audio, {'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert body == AUDIO
+
+
+def test_default_etag(tmp_path):
+    with app.test_request_context('/'):
+        assert audio_file_response(AUDIO, 'audio/mpeg', 'out.mp3').get_etag()[0] == hash_audio_bytes(AUDIO)
+        path = tmp_path / 'abc123.mp3'
+        path.write_bytes(AUDIO)
+        response = audio_file_response(str(path), 'audio/mpeg', 'out.mp3')
+        response.response.close()
+        assert response.get_etag()[0] == 'abc123'
+
+
+def test_evicted_path(tmp_path):
+    with app.test_request_context('/'):
+        with pytest.raises(FileNotFoundError):
+            audio_file_response(str(tmp_path / 'gone.mp3'), 'audio/mpeg', 'out.mp3')
@@ -0,0 +1,67 @@
+import os
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_cache import RenderCache
+from audio_prerender import TempoLadderPrerenderer, parse_tempo_ladder
+from audio_workers import AudioWorkerPool
+
+
+def test_range_is_inclusive():
+    assert parse_tempo_ladder('60-100:20') == [60.0, 80.0, 100.0]
+    assert parse_tempo_ladder('90-120') == [90.0, 100.0, 110.0, 120.0]
+
+
+def test_list():
+    assert parse_tempo_ladder(' 90, 120,,150 ') == [90.0, 120.0, 150.0]
+
+
+@pytest.mark.parametrize('spec', [None, '', '  '])
+def test_empty(spec):
+    assert parse_tempo_ladder(spec) == []
+
+
+@pytest.mark.parametrize('spec', ['120-60', '60-120:0', '60-120:-5', 'fast'])
+def test_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_tempo_ladder(spec)
+
+
+def test_contains_does_not_count_as_lookup(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    cache.put('abc', 1.5, 'mp3', b'audio')
+    assert cache.contains('abc', 1.5, 'mp3')
+    assert not cache.contains('abc', 2.0, 'mp3')
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 0
+
+
+def test_ladder_renders_missing_tempos(tmp_path, click_wav):
+    cache = RenderCache(str(tmp_path / 'renders'))
+    upload = tmp_path / 'upload-1'
+    upload.write_bytes(click_wav(120, 4))
+    # 150 BPM is already rendered and must be skipped
+    cache.put('song', 150 / 120, 'wav', b'existing', ext='wav')
+
+    pool = AudioWorkerPool(max_workers=1, max_queue=0, timeout=120)
+    ladder = TempoLadderPrerenderer(pool, cache, [90, 120, 150], format='wav', codec='wav', ext='wav')
+    try:
+        assert ladder.schedule('song', str(upload), 120.0, np.arange(0.25, 4, 0.5))
+        # The request removes its upload as soon as it returns
+        upload.unlink()
+        deadline = time.monotonic() + 120
+        while ladder.stats()['pending'] and time.monotonic() < deadline:
+            time.sleep(0.1)
+    finally:
+        pool.shutdown()
+
+    stats = ladder.stats()
+    assert (stats['pending'], stats['rendered'], stats['skipped'], stats['failed']) == (0, 2, 1, 0)
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 0
+    audio, sample_rate = sf.read(cache.get('song', 90 / 120, 'wav'))
+    assert len(audio) == pytest.approx(4 * sample_rate / 0.75, abs=1)
+    # The link to the upload and the workers' temp files are gone
+    assert os.listdir(tmp_path) == ['renders']
+    assert all(not name.endswith('.tmp') for name in os.listdir(cache.directory))
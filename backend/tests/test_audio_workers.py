@@ -0,0 +1,32 @@
+import os
+import time
+
+import pytest
+
+from audio_workers import AudioWorkerPool, WorkerPoolBusy
+
+
+@pytest.fixture
+def pool():
+    pool = AudioWorkerPool(max_workers=1, max_queue=0, timeout=3)
+    yield pool
+    pool.shutdown()
+
+
+def test_full_pool_rejects_jobs(pool):
+    future = pool.submit(time.sleep, 1)
+    with pytest.raises(WorkerPoolBusy):
+        pool.submit(time.sleep, 1)
+    pool.result(future, timeout=60)
+    assert pool.run(abs, -3, timeout=60) == 3
+
+
+def test_stuck_job_frees_its_worker(pool):
+    stuck_pid = pool.run(os.getpid, timeout=60)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.run(time.sleep, 600)
+    assert time.monotonic() - started < 30
+
+    # The only worker was stuck; the next job gets its slot and a new process
+    assert pool.run(os.getpid, timeout=60, wait=True) != stuck_pid
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from api_calls import beat_adjustment, beat_adjustment_batch
+
+TEMPO = 100.0
+BEATS = np.cumsum(np.full(40, 0.6)) + np.random.default_rng(1).normal(0, 0.005, 40)
+
+
+def reference_adjustment(tempo, beat_times, target_tempo):
+    """The original per-target loop, kept as the behaviour to match."""
+    options = [tempo, tempo / 2, tempo * 2]
+    diffs = [abs(target_tempo - option) for option in options]
+    choice = diffs.index(min(diffs))
+    effective_tempo = options[choice]
+    if choice == 0:
+        grid = beat_times
+    elif choice == 1:
+        grid = beat_times[::2]
+    else:
+        grid = []
+        for i in range(len(beat_times) - 1):
+            grid += [beat_times[i], (beat_times[i] + beat_times[i + 1]) / 2]
+        grid = np.array(grid + [beat_times[-1]])
+    return grid * (effective_tempo / target_tempo), target_tempo / effective_tempo
+
+
+# Includes the ties between options (75 and 150) that must resolve in order
+TARGETS = [40, 50, 60, 74.9, 75, 75.1, 90, 100, 120, 149.9, 150, 150.1, 200, 240]
+
+
+def test_batch_matches_reference():
+    adjusted, speed_factors = beat_adjustment_batch(TEMPO, BEATS, TARGETS)
+    assert len(adjusted) == len(TARGETS)
+    for target, beats, speed_factor in zip(TARGETS, adjusted, speed_factors):
+        expected, expected_speed = reference_adjustment(TEMPO, BEATS, target)
+        assert beats.dtype == np.float32
+        assert speed_factor == pytest.approx(expected_speed)
+        np.testing.assert_allclose(beats, expected, rtol=1e-6, atol=1e-5)
+
+
+@pytest.mark.parametrize('target', TARGETS)
+def test_single_matches_batch(target):
+    beats, speed_factor = beat_adjustment(np.array([TEMPO]), BEATS, target)
+    batch_beats, batch_speeds = beat_adjustment_batch(TEMPO, BEATS, [target])
+    assert isinstance(speed_factor, float)
+    assert speed_factor == batch_speeds[0]
+    np.testing.assert_array_equal(beats, batch_beats[0])
+
+
+def test_short_beat_lists():
+    # Original grid, doubled grid sped up 2x, halved grid slowed down 2x
+    adjusted, _ = beat_adjustment_batch(TEMPO, [1.0], [100, 400, 25])
+    assert [beats.tolist() for beats in adjusted] == [[1.0], [0.5], [2.0]]
+    adjusted, _ = beat_adjustment_batch(TEMPO, [], [100, 400, 25])
+    assert all(len(beats) == 0 for beats in adjusted)
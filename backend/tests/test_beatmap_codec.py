@@ -0,0 +1,102 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from beatmap_codec import (
+    FEATURE_ARRAYS,
+    beat_times_to_ms,
+    decode_beatmap,
+    decode_feature_bundle,
+    encode_beatmap,
+    encode_feature_bundle,
+)
+
+
+BEATS = np.array([0.0, 0.0004, 0.1275, 0.5, 0.627, 17.0, 3600.25])
+
+
+@pytest.mark.parametrize('encoding', ['varint', 'int32'])
+def test_beatmap_round_trip(encoding):
+    decoded = decode_beatmap(encode_beatmap(BEATS, encoding))
+    assert decoded.dtype == np.int32
+    # 127/128 ms and a 16 s+ gap exercise the one-, two- and three-byte varints
+    assert decoded.tolist() == [0, 0, 128, 500, 627, 17000, 3600250]
+
+
+@pytest.mark.parametrize('encoding', ['varint', 'int32'])
+def test_empty_beatmap(encoding):
+    assert decode_beatmap(encode_beatmap([], encoding)).tolist() == []
+
+
+def test_beat_times_are_sorted_and_clamped():
+    assert beat_times_to_ms([0.5, -0.01, 0.25]).tolist() == [0, 250, 500]
+
+
+def test_varint_is_smaller_than_int32():
+    beats = np.arange(200) * 0.5
+    assert len(encode_beatmap(beats, 'varint')) < len(encode_beatmap(beats, 'int32'))
+
+
+@pytest.mark.parametrize('encoding', ['varint', 'int32'])
+def test_truncated_beatmap(encoding):
+    data = encode_beatmap(BEATS, encoding)
+    with pytest.raises(ValueError, match='Truncated'):
+        decode_beatmap(data[:-1])
+    with pytest.raises(ValueError, match='Truncated'):
+        decode_beatmap(data[:5])
+
+
+def test_rejects_other_formats():
+    data = bytearray(encode_beatmap(BEATS))
+    with pytest.raises(ValueError, match='version 1'):
+        decode_beatmap(b'XXXX' + bytes(data[4:]))
+    data[5] = 7
+    with pytest.raises(ValueError, match='Unknown beatmap encoding'):
+        decode_beatmap(bytes(data))
+    with pytest.raises(ValueError):
+        encode_beatmap(BEATS, 'float')
+
+
+def _features(n_beats=5, n_frames=7, n_peaks=3):
+    return {
+        'tempo': 120.5,
+        'duration': 12.25,
+        'sample_rate': 22050,
+        'frame_rate': 22050 / 512,
+        'peaks_per_second': 50,
+        'beat_times': np.linspace(0.5, 2.5, n_beats),
+        'onset_envelope': np.linspace(0, 1, n_frames),
+        'rms': np.linspace(1, 0, n_frames),
+        'peaks': np.linspace(0, 0.5, n_peaks),
+    }
+
+
+def test_feature_bundle_round_trip():
+    features = _features()
+    decoded = decode_feature_bundle(encode_feature_bundle(features))
+    for name in FEATURE_ARRAYS:
+        assert decoded[name].dtype == np.dtype('<f4')
+        np.testing.assert_allclose(decoded[name], features[name], rtol=1e-6)
+    assert decoded['tempo'] == features['tempo']
+    assert decoded['peaks_per_second'] == 50
+
+
+@pytest.mark.parametrize('n_beats', [0, 1, 2, 3, 4])
+def test_feature_bundle_arrays_are_aligned(n_beats):
+    data = encode_feature_bundle(_features(n_beats=n_beats))
+    header_len = struct.unpack_from('<I', data, 4)[0]
+    assert header_len % 4 == 0
+    header = json.loads(data[8:8 + header_len])
+    data_start = 8 + header_len
+    end = data_start
+    for entry in header['arrays']:
+        assert (data_start + entry['offset']) % 4 == 0
+        end = data_start + entry['offset'] + 4 * entry['length']
+    assert end == len(data)
+
+
+def test_feature_bundle_rejects_other_data():
+    with pytest.raises(ValueError):
+        decode_feature_bundle(encode_beatmap(BEATS))
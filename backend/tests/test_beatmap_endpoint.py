@@ -0,0 +1,53 @@
+import gzip
+
+import numpy as np
+import pytest
+
+import app as backend
+from api_calls import beat_cache_key
+from beatmap_codec import decode_beatmap
+
+AUDIO_HASH = 'beatmap-endpoint-test'
+BEATS = np.arange(0.5, 30, 0.5, dtype=np.float32)
+
+
+@pytest.fixture(scope='module')
+def client():
+    backend.beat_cache.put(beat_cache_key(AUDIO_HASH, 'full'), 120.0, BEATS, 30.0)
+    return backend.app.test_client()
+
+
+def test_beatmap(client):
+    response = client.get(f'/api/audio/beatmap/{AUDIO_HASH}')
+    assert response.status_code == 200
+    assert decode_beatmap(response.data).tolist() == [int(round(t * 1000)) for t in BEATS]
+    assert response.headers['X-Beat-Count'] == str(len(BEATS))
+    # The analysis behind the URL can be recomputed, so it is revalidated
+    assert 'immutable' not in response.headers['Cache-Control']
+    assert response.headers['Cache-Control'] == f'public, max-age={backend.BEATMAP_MAX_AGE}'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_revalidation(client):
+    etag = client.get(f'/api/audio/beatmap/{AUDIO_HASH}').headers['ETag']
+    response = client.get(f'/api/audio/beatmap/{AUDIO_HASH}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    adjusted = client.get(f'/api/audio/beatmap/{AUDIO_HASH}?tempo=90', headers={'If-None-Match': etag})
+    assert adjusted.status_code == 200
+
+
+def test_gzip_has_its_own_etag(client):
+    identity = client.get(f'/api/audio/beatmap/{AUDIO_HASH}')
+    compressed = client.get(f'/api/audio/beatmap/{AUDIO_HASH}', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == identity.data
+    assert compressed.headers['ETag'] != identity.headers['ETag']
+
+
+def test_progressive_is_not_cached(client):
+    response = client.get(f'/api/audio/beatmap/{AUDIO_HASH}?progressive=true')
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+
+
+def test_unknown_audio(client):
+    assert client.get('/api/audio/beatmap/not-analysed').status_code == 404
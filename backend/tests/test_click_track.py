@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from api_calls import _click_samples, generate_beat_audio, render_click_track
+
+SAMPLE_RATE = 8000
+
+
+def reference_track(beat_times, duration, sample_rate=SAMPLE_RATE, headroom_db=1.0):
+    """One click copied in per beat, then the same clip, fades and normalisation."""
+    click = _click_samples(sample_rate)
+    track = np.zeros(int(round(duration * sample_rate)), dtype=np.float64)
+    for beat in beat_times:
+        if 0 <= beat <= duration:
+            start = int(round(beat * sample_rate))
+            end = min(start + len(click), len(track))
+            track[start:end] += click[:end - start]
+    track = np.clip(track, -1.0, 1.0)
+    edge = min(int(sample_rate * 0.01), len(track) // 2)
+    ramp = np.linspace(0.0, 1.0, edge, endpoint=False)
+    track[:edge] *= ramp
+    track[-edge:] *= ramp[::-1]
+    return track * (10 ** (-headroom_db / 20) / np.abs(track).max())
+
+
+def test_matches_per_beat_rendering():
+    # Overlapping clicks (summed, then clipped), a beat past the end and one
+    # whose click runs off the end of the track
+    beats = np.array([0.5, 0.5001, 1.0, 1.7, 1.9995, 2.5, -0.1])
+    track = render_click_track(beats, duration=2.0, sample_rate=SAMPLE_RATE)
+    assert track.dtype == np.float32
+    assert len(track) == 2 * SAMPLE_RATE
+    np.testing.assert_allclose(track, reference_track(beats, 2.0), atol=1e-5)
+
+
+def test_peak_is_normalised():
+    track = render_click_track([0.1, 0.6], duration=1.0, sample_rate=SAMPLE_RATE, headroom_db=3.0)
+    assert np.abs(track).max() == pytest.approx(10 ** (-3 / 20), rel=1e-5)
+
+
+def test_default_duration_ends_after_last_click():
+    click = _click_samples(SAMPLE_RATE)
+    track = render_click_track([0.25, 1.5], sample_rate=SAMPLE_RATE)
+    assert len(track) == int(round(1.5 * SAMPLE_RATE)) + len(click)
+
+
+def test_click_position_late_in_long_track():
+    # float32 seconds would round this beat to a different sample
+    beat = 3599.9999
+    track = render_click_track([beat], duration=3600.5, sample_rate=44100)
+    # The click's first sample is sin(0) = 0
+    assert np.flatnonzero(track)[0] == int(round(beat * 44100)) + 1
+
+
+def test_no_beats():
+    track = render_click_track([], duration=0.5, sample_rate=SAMPLE_RATE)
+    assert len(track) == SAMPLE_RATE // 2
+    assert not track.any()
+
+
+def test_generate_beat_audio(tmp_path):
+    path = str(tmp_path / 'clicks.wav')
+    generate_beat_audio(np.array([0.1, 0.6]), path, duration=1.0, sample_rate=SAMPLE_RATE)
+    audio, sample_rate = sf.read(path, dtype='float32')
+    assert sample_rate == SAMPLE_RATE
+    assert audio.shape == (SAMPLE_RATE, 2)
+    np.testing.assert_allclose(audio[:, 0], reference_track([0.1, 0.6], 1.0), atol=1e-4)
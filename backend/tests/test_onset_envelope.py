@@ -0,0 +1,43 @@
+import librosa
+import numpy as np
+import pytest
+
+from api_calls import chunked_onset_envelope, streaming_beat_tracking, wav_beat_tracking_from_bytes
+
+SAMPLE_RATE = 22050
+
+
+@pytest.fixture(scope='module')
+def signal():
+    rng = np.random.default_rng(0)
+    y = (rng.standard_normal(SAMPLE_RATE * 8) * 0.01).astype(np.float32)
+    for start in (np.arange(0.1, 8, 0.5) * SAMPLE_RATE).astype(int):
+        y[start:start + 400] += np.hanning(400).astype(np.float32) * 0.8
+    return y
+
+
+@pytest.mark.parametrize('block_size', [1000, 2048, SAMPLE_RATE, SAMPLE_RATE * 8])
+def test_matches_in_memory_envelope(signal, block_size):
+    reference = librosa.onset.onset_strength(y=signal, sr=SAMPLE_RATE, hop_length=512)
+    blocks = ((SAMPLE_RATE, signal[i:i + block_size]) for i in range(0, len(signal), block_size))
+    envelope, sr, total_samples = chunked_onset_envelope(blocks)
+    assert sr == SAMPLE_RATE
+    assert total_samples == len(signal)
+    assert envelope.shape == reference.shape
+    np.testing.assert_allclose(envelope, reference, atol=1e-5)
+
+
+def test_no_blocks():
+    with pytest.raises(ValueError):
+        chunked_onset_envelope(iter([]))
+
+
+def test_streaming_tracker_matches_in_memory(click_wav):
+    audio = click_wav(120, 20)
+    tempo, beats = wav_beat_tracking_from_bytes(audio, profile='balanced')
+    streamed_tempo, streamed_beats, duration = streaming_beat_tracking(audio, profile='balanced', block_seconds=3)
+    assert streamed_tempo == pytest.approx(tempo)
+    assert duration == pytest.approx(20.0)
+    assert len(streamed_beats) == len(beats)
+    # Within one hop of the in-memory tracker
+    assert np.abs(streamed_beats - beats).max() <= 512 / SAMPLE_RATE
@@ -0,0 +1,61 @@
+import io
+import json
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import api_calls
+from api_calls import progressive_beat_tracking
+
+
+@pytest.fixture(scope='module')
+def steady_track(click_wav):
+    return click_wav(120, 60)
+
+
+@pytest.fixture(scope='module')
+def silence():
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros(22050 * 60, dtype=np.float32), 22050, format='WAV')
+    return buffer.getvalue()
+
+
+def test_extrapolated_grid_matches_full_tracking(steady_track):
+    tempo, beats, duration, info = progressive_beat_tracking(steady_track, 'balanced', probe_seconds=20)
+    assert info['method'] == 'extrapolated'
+    assert info['ibi_cv'] < 0.05
+
+    # A probe longer than the track sends it through the regular tracker
+    _, full_beats, full_duration, full_info = progressive_beat_tracking(
+        steady_track, 'balanced', probe_seconds=120)
+    assert full_info['method'] == 'full'
+    assert full_info['reason'] == 'short'
+
+    # The full tracker's tempo is a tempogram bin, so compare with its beat
+    # spacing, which is frame-quantised beat to beat but right on average
+    assert tempo == pytest.approx(60.0 / np.mean(np.diff(full_beats)), rel=0.01)
+    assert duration == pytest.approx(full_duration, abs=0.1)
+    assert abs(len(beats) - len(full_beats)) <= 2
+    nearest = np.abs(beats[:, None] - full_beats[None, :]).min(axis=1)
+    assert np.median(nearest) < 0.03
+    clicks = np.arange(0.25, 59.9, 0.5)
+    for tracked in (beats, full_beats):
+        assert np.abs(tracked[:, None] - clicks[None, :]).min(axis=1).max() < 0.05
+
+
+def test_silence_has_too_few_beats(silence):
+    _, _, _, info = progressive_beat_tracking(silence, 'balanced', probe_seconds=20)
+    assert info['method'] == 'full'
+    assert info['reason'] == 'too_few_beats'
+    assert info['ibi_cv'] is None
+    json.dumps(info, allow_nan=False)
+
+
+def test_zero_probe_tempo_falls_back(silence, monkeypatch):
+    monkeypatch.setattr(api_calls, '_envelope_tempo', lambda envelope, sr: 0.0)
+    _, _, duration, info = progressive_beat_tracking(silence, 'balanced', probe_seconds=20)
+    assert info['method'] == 'full'
+    assert info['reason'] == 'no_tempo'
+    assert duration == pytest.approx(60.0)
+    json.dumps(info, allow_nan=False)
@@ -0,0 +1,63 @@
+import librosa
+import numpy as np
+import pytest
+
+from api_calls import iter_time_stretch, time_stretch
+
+SAMPLE_RATE = 22050
+
+
+def sine(frequency, seconds, channels=1):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    return np.repeat(tone[:, np.newaxis], channels, axis=1)
+
+
+def dominant_frequency(samples):
+    spectrum = np.abs(np.fft.rfft(samples[:, 0] * np.hanning(len(samples))))
+    return np.argmax(spectrum) * SAMPLE_RATE / len(samples)
+
+
+@pytest.mark.parametrize('speed_factor', [0.5, 0.8, 1.25, 2.0])
+def test_length_and_pitch(speed_factor):
+    samples = sine(440, 2.0, channels=2)
+    stretched = time_stretch(samples, speed_factor)
+    assert stretched.dtype == np.float32
+    assert stretched.shape == (round(len(samples) / speed_factor), 2)
+    assert dominant_frequency(stretched) == pytest.approx(440, abs=2)
+    np.testing.assert_array_equal(stretched[:, 0], stretched[:, 1])
+
+
+@pytest.mark.parametrize('speed_factor', [0.5, 0.8, 1.25, 2.0])
+def test_matches_librosa(speed_factor):
+    noise = (np.random.default_rng(0).standard_normal(SAMPLE_RATE * 2) * 0.1).astype(np.float32)
+    stretched = time_stretch(noise[:, np.newaxis], speed_factor)[:, 0]
+    reference = librosa.effects.time_stretch(noise, rate=speed_factor)
+    assert len(stretched) == len(reference)
+    error = np.sqrt(np.mean((stretched - reference) ** 2) / np.mean(reference ** 2))
+    assert error < 0.05
+
+
+def test_block_size_does_not_change_output():
+    samples = sine(330, 1.5)
+    whole = time_stretch(samples, 0.7, block_frames=1024)
+    blocks = list(iter_time_stretch(samples, 0.7, block_frames=8))
+    assert len(blocks) > 1
+    np.testing.assert_allclose(np.concatenate(blocks), whole, atol=1e-5)
+
+
+def test_unit_speed_is_passthrough():
+    samples = sine(440, 0.5)
+    assert time_stretch(samples, 1.0) is samples
+    np.testing.assert_array_equal(np.concatenate(list(iter_time_stretch(samples, 1.0))), samples)
+
+
+@pytest.mark.parametrize('speed_factor', [0.5, 1.0, 2.0])
+def test_empty_input(speed_factor):
+    stretched = time_stretch(np.zeros((0, 2), dtype=np.float32), speed_factor)
+    assert stretched.shape == (0, 2)
+
+
+def test_invalid_speed():
+    with pytest.raises(ValueError):
+        time_stretch(sine(440, 0.1), 0)
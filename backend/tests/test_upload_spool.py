@@ -0,0 +1,30 @@
+import io
+import os
+
+from app import UPLOAD_SPOOL_THRESHOLD, app, upload_source
+
+
+def post_context(size):
+    data = {'file': (io.BytesIO(b'x' * size), 'song.mp3')}
+    return app.test_request_context('/', method='POST', data=data, content_type='multipart/form-data')
+
+
+def test_large_upload_is_spooled_and_removed_on_close():
+    with post_context(UPLOAD_SPOOL_THRESHOLD + 1) as ctx:
+        path = upload_source(ctx.request.files['file'])
+        assert isinstance(path, str)
+        assert os.path.dirname(path) == app.config['UPLOAD_FOLDER']
+        # Other readers (ffmpeg, the workers) open it by path while it is open
+        with open(path, 'rb') as f:
+            assert len(f.read()) == UPLOAD_SPOOL_THRESHOLD + 1
+        link = f"{path}.stream"
+        os.link(path, link)
+    assert not os.path.exists(path)
+    # A hard link taken during the request outlives it
+    assert os.path.exists(link)
+    os.remove(link)
+
+
+def test_small_upload_stays_in_memory():
+    with post_context(100) as ctx:
+        assert upload_source(ctx.request.files['file']) == b'x' * 100
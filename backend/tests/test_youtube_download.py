@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+from api_calls import FixtureExtractor, download_youtube_audio, youtube_video_id
+from app import app, cached_audio_response
+from audio_cache import DownloadCache
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+@pytest.mark.parametrize('url', [
+    VIDEO_ID,
+    f'https://www.youtube.com/watch?v={VIDEO_ID}',
+    f'https://www.youtube.com/watch?feature=share&v={VIDEO_ID}&t=42s',
+    f'youtube.com/watch?v={VIDEO_ID}',
+    f'https://m.youtube.com/watch?v={VIDEO_ID}&list=PL123',
+    f'https://music.youtube.com/watch?v={VIDEO_ID}',
+    f'https://youtu.be/{VIDEO_ID}?si=abc',
+    f'https://www.youtube.com/shorts/{VIDEO_ID}',
+    f'https://www.youtube.com/embed/{VIDEO_ID}?start=10',
+    f'https://www.youtube.com/live/{VIDEO_ID}',
+    f'https://www.youtube-nocookie.com/embed/{VIDEO_ID}',
+    f'  https://youtu.be/{VIDEO_ID}  ',
+])
+def test_video_id(url):
+    assert youtube_video_id(url) == VIDEO_ID
+
+
+@pytest.mark.parametrize('url', [
+    None,
+    '',
+    'https://www.youtube.com/',
+    'https://www.youtube.com/watch?v=short',
+    'https://www.youtube.com/channel/UC1234567890',
+    f'https://example.com/watch?v={VIDEO_ID}',
+    f'https://notyoutu.be/{VIDEO_ID}',
+])
+def test_unrecognised_urls(url):
+    assert youtube_video_id(url) is None
+
+
+@pytest.fixture
+def fixture_dir(tmp_path):
+    directory = tmp_path / 'fixtures'
+    directory.mkdir()
+    (directory / f'{VIDEO_ID}.m4a').write_bytes(b'audio data')
+    (directory / f'{VIDEO_ID}.json').write_text(json.dumps({'title': 'Fixture', 'duration': 212}))
+    return str(directory)
+
+
+class CountingExtractor(FixtureExtractor):
+    def __init__(self, fixture_dir):
+        super().__init__(fixture_dir)
+        self.calls = 0
+
+    def __call__(self, url, output_dir):
+        self.calls += 1
+        return super().__call__(url, output_dir)
+
+
+def test_fixture_extractor(fixture_dir, tmp_path):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    info = FixtureExtractor(fixture_dir)(f'https://youtu.be/{VIDEO_ID}', str(output_dir))
+    assert info == {'path': str(output_dir / 'audio.m4a'), 'title': 'Fixture', 'duration': 212, 'ext': 'm4a'}
+    with pytest.raises(FileNotFoundError):
+        FixtureExtractor(fixture_dir)('https://youtu.be/aaaaaaaaaaa', str(output_dir))
+
+
+def test_download_cache_by_video_id(fixture_dir, tmp_path):
+    cache = DownloadCache(str(tmp_path / 'downloads'))
+    extractor = CountingExtractor(fixture_dir)
+
+    first = download_youtube_audio(f'https://www.youtube.com/watch?v={VIDEO_ID}', cache, extractor)
+    assert first['video_id'] == VIDEO_ID
+    assert first['title'] == 'Fixture'
+    assert first['ext'] == 'm4a'
+    with open(first['path'], 'rb') as f:
+        assert f.read() == b'audio data'
+
+    # Another link to the same video is a hit without the extractor
+    second = download_youtube_audio(f'https://youtu.be/{VIDEO_ID}?si=x', cache, extractor)
+    assert extractor.calls == 1
+    assert second['path'] == first['path']
+    assert second['duration'] == 212
+    # Only the cached file is left; the download directory is cleaned up
+    assert sorted(os.listdir(cache.directory)) == ['dQ', 'index.db']
+
+
+def test_download_without_cache(fixture_dir):
+    result = download_youtube_audio(VIDEO_ID, extractor=FixtureExtractor(fixture_dir))
+    assert result['audio'] == b'audio data'
+    assert 'path' not in result
+
+
+def test_evicted_audio_is_rendered_again(tmp_path):
+    rerenders = []
+
+    def rerender():
+        rerenders.append(1)
+        return b'fresh audio'
+
+    with app.test_request_context('/'):
+        response = cached_audio_response(str(tmp_path / 'evicted.mp3'), 'audio/mpeg', 'out.mp3', rerender)
+        assert response.status_code == 200
+        assert b''.join(response.response) == b'fresh audio'
+    assert rerenders == [1]
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef, useMemo } from 'react';
 import './UnifiedRhythmGame.css';
 import RhythmNote from './osu/RhythmNote';
+import { streamBeats } from '../../utils/beatmap';
 
 const PLACEHOLDER_TEXTS = [
     'Proteins are polypeptides folded into 3D shapes that perform biological functions. The twenty amino acids combine through peptide bonds to create unique structures.',
@@ -35,6 +36,39 @@ const generateBeatmapFromTempo = (bpm = 120, durationSeconds = 60) => {
     return beatmap;
 };
 
+// Circles appear this long before their hit time
+const APPROACH_MS = 2000;
+
+// Fetch the server-generated chart (GET /api/beatmap) for analysed audio.
+// Server notes carry the hit time, while the render loop schedules circles
+// by appearance time, so shift them by the approach window.
+const fetchServerBeatmap = async (audioHash, targetTempo, difficulty, signal) => {
+    const params = new URLSearchParams({ audio_hash: audioHash, difficulty });
+    if (targetTempo) params.set('target_tempo', targetTempo);
+    const response = await fetch(`/api/beatmap?${params}`, { signal });
+    if (!response.ok) throw new Error(`Failed to load beatmap (${response.status})`);
+    const { notes } = await response.json();
+    return notes
+        .map((note) => ({ ...note, time: note.time - APPROACH_MS }))
+        .filter((note) => note.time >= 0);
+};
+
+// Notes for streamed beat times (ms), continuing the lane cycle after
+// firstIndex earlier notes; shifted by the approach window like server notes
+const notesFromBeats = (beatTimes, firstIndex) => {
+    const positions = ['left', 'center-left', 'center-right', 'right'];
+    return Array.from(beatTimes, (ms, i) => {
+        const index = firstIndex + i;
+        return {
+            id: `beat-${index}-${ms}`,
+            time: ms - APPROACH_MS,
+            position: positions[index % 4],
+            keyHint: ['D', 'F', 'J', 'K'][index % 4],
+            posIndex: index % 4,
+        };
+    }).filter((note) => note.time >= 0);
+};
+
 // Hit Feedback Component
 const HitFeedback = ({ type, position, wordsAdvanced }) => {
     const [visible, setVisible] = useState(true);
@@ -72,7 +106,7 @@ const HitFeedback = ({ type, position, wordsAdvanced }) => {
 };
 
 // Main Unified Game Component
-const UnifiedRhythmGame = () => {
+const UnifiedRhythmGame = ({ audioHash, audioFile, targetTempo, difficulty = 'normal', songUrl = '/default-song.mp3' }) => {
     const [gameState, setGameState] = useState('ready');
     const [score, setScore] = useState(0);
     const [combo, setCombo] = useState(0);
@@ -96,7 +130,51 @@ const UnifiedRhythmGame = () => {
     const [selectedText, setSelectedText] = useState(PLACEHOLDER_TEXTS[0]);
     const [wordIndex, setWordIndex] = useState(0);
 
-    const beatMapData = useMemo(() => generateBeatmapFromTempo(120, 60), []);
+    // Chart from the detected beats when the song has been analysed, otherwise a fixed grid
+    const fallbackBeatmap = useMemo(() => generateBeatmapFromTempo(120, 60), []);
+    const [serverBeatmap, setServerBeatmap] = useState(null);
+    useEffect(() => {
+        setServerBeatmap(null);
+        if (!audioHash) return undefined;
+        const controller = new AbortController();
+        fetchServerBeatmap(audioHash, targetTempo, difficulty, controller.signal)
+            .then(setServerBeatmap)
+            .catch((error) => {
+                if (error.name !== 'AbortError') console.error('Beatmap error:', error);
+            });
+        return () => controller.abort();
+    }, [audioHash, targetTempo, difficulty]);
+
+    // A freshly uploaded file is analysed as a stream: the opening beats
+    // arrive first, so play can start while the rest of the song is tracked
+    const [streamedBeatmap, setStreamedBeatmap] = useState(null);
+    const [fileUrl, setFileUrl] = useState(null);
+    useEffect(() => {
+        setStreamedBeatmap(null);
+        setFileUrl(null);
+        if (!audioFile || audioHash) return undefined;
+        const url = URL.createObjectURL(audioFile);
+        setFileUrl(url);
+        const controller = new AbortController();
+        let beatCount = 0;
+        streamBeats(audioFile, {
+            signal: controller.signal,
+            onBeats: (beatTimes) => {
+                const notes = notesFromBeats(beatTimes, beatCount);
+                beatCount += beatTimes.length;
+                setStreamedBeatmap((prev) => [...(prev || []), ...notes]);
+            },
+        }).catch((error) => {
+            if (error.name !== 'AbortError') console.error('Beat stream error:', error);
+        });
+        return () => {
+            controller.abort();
+            URL.revokeObjectURL(url);
+        };
+    }, [audioFile, audioHash]);
+    const waitingForBeats = Boolean(audioFile && !audioHash && !streamedBeatmap);
+
+    const beatMapData = serverBeatmap || streamedBeatmap || fallbackBeatmap;
     const words = selectedText.split(/\s+/).filter(w => w.length > 0);
 
     const KEY_MAP = { 'd': 0, 'f': 1, 'j': 2, 'k': 3 };
@@ -124,7 +202,7 @@ const UnifiedRhythmGame = () => {
                                     position: beat.posIndex,
                                     keyHint: beat.keyHint,
                                     appearTime: beat.time,
-                                    hitTime: beat.time + 2000,
+                                    hitTime: beat.time + APPROACH_MS,
                                 };
                                 setActiveCircles((prevCircles) => [...prevCircles, newCircle]);
                             }
@@ -279,7 +357,7 @@ const UnifiedRhythmGame = () => {
         <div className="unified-rhythm-game">
             <audio
                 ref={audioRef}
-                src="/default-song.mp3"
+                src={fileUrl || songUrl}
                 onEnded={handleAudioEnded}
                 onLoadedMetadata={handleLoadedMetadata}
             />
@@ -289,8 +367,8 @@ const UnifiedRhythmGame = () => {
                     <div className="start-content">
                         <h2>Ready to Play?</h2>
                         <p>Click the circles to the beat and advance through the text!</p>
-                        <button className="btn-start" onClick={startGame}>
-                            START GAME
+                        <button className="btn-start" onClick={startGame} disabled={waitingForBeats}>
+                            {waitingForBeats ? 'ANALYZING...' : 'START GAME'}
                         </button>
                         <div className="key-hint">
                             <span>Press D, F, J, K to hit circles</span>
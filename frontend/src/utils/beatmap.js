@@ -0,0 +1,115 @@
+// Decoder for the binary beatmaps served by GET /api/audio/beatmap/<audio_hash>
+// (see backend/beatmap_codec.py for the layout).
+
+const BEATMAP_MAGIC = 'RNBM';
+const HEADER_SIZE = 10;
+const ENCODING_INT32 = 0;
+const ENCODING_VARINT = 1;
+
+// Returns the beat times in integer milliseconds as an Int32Array
+export const decodeBeatmap = (buffer) => {
+    const view = new DataView(buffer);
+    if (view.byteLength < HEADER_SIZE) {
+        throw new Error('Truncated beatmap');
+    }
+
+    const magic = String.fromCharCode(
+        view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)
+    );
+    if (magic !== BEATMAP_MAGIC || view.getUint8(4) !== 1) {
+        throw new Error('Not a version 1 beatmap');
+    }
+
+    const encoding = view.getUint8(5);
+    const count = view.getUint32(6, true);
+    const beats = new Int32Array(count);
+    let offset = HEADER_SIZE;
+    let time = 0;
+
+    for (let i = 0; i < count; i++) {
+        let delta = 0;
+        if (encoding === ENCODING_INT32) {
+            delta = view.getInt32(offset, true);
+            offset += 4;
+        } else if (encoding === ENCODING_VARINT) {
+            let shift = 0;
+            let byte;
+            do {
+                byte = view.getUint8(offset++);
+                delta += (byte & 0x7f) * 2 ** shift;
+                shift += 7;
+            } while (byte & 0x80);
+        } else {
+            throw new Error(`Unknown beatmap encoding: ${encoding}`);
+        }
+        time += delta;
+        beats[i] = time;
+    }
+
+    return beats;
+};
+
+// Fetches and decodes a beatmap, e.g. from the X-Beatmap-Url response header
+export const fetchBeatmap = async (url, options = {}) => {
+    const response = await fetch(url, options);
+    if (!response.ok) {
+        throw new Error(`Failed to load beatmap (${response.status})`);
+    }
+    return decodeBeatmap(await response.arrayBuffer());
+};
+
+// Decoder for the feature bundles served by /api/audio/features: a JSON
+// header followed by 4-byte aligned float32 arrays, viewed without copying.
+// Returns the header scalars plus a Float32Array per feature.
+export const decodeFeatureBundle = (buffer) => {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(
+        view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)
+    );
+    if (magic !== 'RNFB') {
+        throw new Error('Not a feature bundle');
+    }
+
+    const headerLength = view.getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+    const dataStart = 8 + headerLength;
+    const { arrays, ...features } = header;
+
+    arrays.forEach(({ name, offset, length }) => {
+        features[name] = new Float32Array(buffer, dataStart + offset, length);
+    });
+    return features;
+};
+
+// Uploads a song to POST /api/audio/analyze-stream and reads its NDJSON
+// events as they arrive. onBeats receives each batch of beat times
+// (integer ms, in order): the opening window first, then the rest of the
+// track. Resolves with the final "done" event.
+export const streamBeats = async (file, { onBeats, profile = 'full', firstSeconds, signal } = {}) => {
+    const form = new FormData();
+    form.append('file', file);
+    form.append('profile', profile);
+    if (firstSeconds) form.append('first_seconds', firstSeconds);
+
+    const response = await fetch('/api/audio/analyze-stream', { method: 'POST', body: form, signal });
+    if (!response.ok) {
+        throw new Error(`Failed to analyse audio (${response.status})`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let pending = '';
+    for (;;) {
+        const { value, done } = await reader.read();
+        pending += decoder.decode(value, { stream: !done });
+        const lines = pending.split('\n');
+        pending = lines.pop();
+        for (const line of lines.filter((l) => l.trim())) {
+            const event = JSON.parse(line);
+            if (event.event === 'beats') onBeats?.(event.beat_times);
+            else if (event.event === 'error') throw new Error(event.error);
+            else if (event.event === 'done') return event;
+        }
+        if (done) throw new Error('Analysis stream ended early');
+    }
+};